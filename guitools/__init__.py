@@ -0,0 +1,4 @@
+# The guitools package holds helpers for interactive matplotlib figures
+# that are not specific to any one model, shared by the modules in this
+# folder. Nothing is imported here, so that a script only loads the helpers
+# it uses.
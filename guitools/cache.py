@@ -0,0 +1,176 @@
+# This is a memory cache for model outputs driven by sliders.
+# Sliders snap to a `valstep`, so the same parameter values are visited
+# again and again while scrubbing back and forth. `ResponseCache` keeps the
+# outputs of recent parameter values, up to a total size in bytes, and can
+# compute the neighbouring slider positions in the background, so that the
+# next move of a slider is already cached. This only pays off for models
+# that take a noticeable time per slider position; see
+# `hillslope.table.cached_run` for the hillslope model.
+#
+# example, with a slow function `run(D, U, C)` of three sliders:
+#     run = ResponseCache(run, steps=(1, 0.05, 0.05), prefetch=True)
+#     z = run(100, 0.5, 1) # the next slider positions are run in the background
+
+
+import collections
+import concurrent.futures
+import sys
+import threading
+
+import numpy as np
+
+
+_MISSING = object()
+
+
+def nbytes(value):
+    """
+    the approximate size in bytes of a model output: an array, a number, or
+    a tuple or list of them.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResponseCache(object):
+    """
+    ResponseCache(func, steps) returns a function that computes
+    `func(*params)` and remembers the result.
+
+    The parameters are quantized to multiples of `steps` (one step per
+    parameter, e.g. the `valstep` of every slider), and `func` is always
+    called with the quantized values, so that every slider position maps to
+    one cache entry. When the total size of the cached outputs exceeds
+    `max_bytes`, the least recently used outputs are dropped.
+
+    With `prefetch=True`, every call also computes the outputs one step up
+    and down from the requested parameters, in the background, staying
+    within `bounds` (a (min, max) pair per parameter, optional). Prefetches
+    around earlier positions that have not started yet are dropped, and a
+    requested position that is still queued is computed right away, so a
+    request never waits behind the prefetch queue. Errors in the background
+    are ignored; the same parameters raise again when they are requested.
+
+    Cached outputs are shared between calls, and must not be modified.
+    """
+
+    def __init__(self, func, steps, max_bytes=64 * 2**20, prefetch=False,
+                 bounds=None, workers=1):
+        self.func = func
+        self.steps = tuple(steps)
+        self.max_bytes = max_bytes
+        self.bounds = bounds
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict() # key: output, oldest first
+        self._pending = {} # key: future of a background computation
+        self._lock = threading.Lock()
+        self._executor = None
+        if prefetch:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def __call__(self, *params):
+        key = self.key(params)
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                future = self._pending.get(key)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if value is _MISSING:
+            if future is not None:
+                if future.cancel():
+                    # still queued behind other prefetches, compute it now
+                    with self._lock:
+                        self._pending.pop(key, None)
+                else:
+                    # already being computed in the background
+                    future.result()
+                    value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                value = self.func(*self.values(key))
+                self._store(key, value)
+        if self._executor is not None:
+            self._prefetch(key)
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, params):
+        return self.key(params) in self._entries
+
+    def key(self, params):
+        """
+        the cache key of `params`: the number of steps of every parameter.
+        """
+        return tuple(int(round(p / s)) for p, s in zip(params, self.steps))
+
+    def values(self, key):
+        """
+        the quantized parameter values of the cache `key`.
+        """
+        return tuple(k * s for k, s in zip(key, self.steps))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def close(self):
+        """
+        stop the background computations.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _store(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.nbytes += nbytes(value)
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= nbytes(old)
+
+    def _neighbours(self, key):
+        for i in range(len(key)):
+            for offset in (-1, 1):
+                neighbour = key[:i] + (key[i] + offset,) + key[i+1:]
+                if self.bounds is not None:
+                    lo, hi = self.bounds[i]
+                    value = neighbour[i] * self.steps[i]
+                    tol = 1e-9 * abs(self.steps[i]) # round off in the steps
+                    if value < lo - tol or value > hi + tol:
+                        continue
+                yield neighbour
+
+    def _prefetch(self, key):
+        with self._lock:
+            # drop the queued prefetches around earlier positions, so that
+            # only the neighbours of the latest position are computed
+            neighbours = list(self._neighbours(key))
+            for other, future in list(self._pending.items()):
+                if other not in neighbours and future.cancel():
+                    del self._pending[other]
+            for neighbour in neighbours:
+                if neighbour in self._entries or neighbour in self._pending:
+                    continue
+                self._pending[neighbour] = self._executor.submit(self._background, neighbour)
+
+    def _background(self, key):
+        try:
+            self._store(key, self.func(*self.values(key)))
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
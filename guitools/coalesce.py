@@ -0,0 +1,131 @@
+# This is an update helper for interactive figures with heavy models.
+# Dragging a slider fires a callback for every mouse motion event; if each
+# of them recomputes the model, the event loop floods and the figure stops
+# responding. `CoalescedUpdate` instead records that an update is wanted,
+# and recomputes at most once per timer tick with the latest slider values,
+# optionally on a worker thread, so that only the newest result is drawn.
+#
+# example, with sliders `slide_D`, `slide_U`, and `slide_C`, a line
+# `theline`, and `run(D, U, C)` running the hillslope model to steady state
+# (see `hillslope.table.cached_run`), which takes a fraction of a second:
+#     update = CoalescedUpdate(fig.canvas, compute=lambda params: run(*params),
+#                              draw=theline.set_ydata,
+#                              read=lambda: (slide_D.val, slide_U.val, slide_C.val),
+#                              threaded=True)
+#     for slider in (slide_D, slide_U, slide_C):
+#         slider.on_changed(update)
+
+
+import concurrent.futures
+import traceback
+
+
+class CoalescedUpdate(object):
+    """
+    CoalescedUpdate(canvas, compute, draw) is a widget callback that
+    coalesces bursts of events into one recompute per timer tick.
+
+    On every tick of a timer on `canvas` (every `interval` milliseconds,
+    while there is work to do), the parameters are read with `read()` (or
+    taken from the value passed by the latest event, without `read`), the
+    model output is computed with `compute(params)`, and shown with
+    `draw(result)` followed by `canvas.draw_idle()`. Events that arrive
+    between two ticks only cause one recompute, with the latest values.
+
+    With `threaded=True`, `compute` runs on a worker thread, so the figure
+    stays responsive while it works. At most one computation runs at a
+    time; a result that is out of date by the time it finishes is dropped,
+    and the latest request is computed next. A long `compute` can call
+    `stale()` to find out whether its result will be dropped, and return
+    early. `read` and `draw` always run on the GUI thread. If `compute`
+    raises on the worker thread, the error is printed, and the next request
+    is computed as usual.
+    """
+
+    def __init__(self, canvas, compute, draw, read=None, interval=30,
+                 threaded=False):
+        self.canvas = canvas
+        self.compute = compute
+        self.draw = draw
+        self.read = read
+        self.threaded = threaded
+        self._value = None
+        self._requested = 0 # number of the latest request
+        self._started = 0 # number of the request last computed
+        self._future = None
+        self._executor = None
+        if threaded:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._timer = canvas.new_timer(interval=interval)
+        self._timer.add_callback(self._tick)
+        self._running = False
+
+    def __call__(self, value=None):
+        self._value = value
+        self._requested += 1
+        if not self._running:
+            self._running = True
+            self._timer.start()
+
+    def stale(self):
+        """
+        whether a newer request has arrived since the current computation
+        started.
+        """
+        return self._started != self._requested
+
+    def _tick(self):
+        # collect the result of the computation on the worker thread
+        if self._future is not None:
+            if not self._future.done():
+                return
+            future, self._future = self._future, None
+            try:
+                number, result = future.result()
+            except Exception:
+                traceback.print_exc()
+            else:
+                if number == self._requested:
+                    self._show(result)
+
+        # nothing new to compute, sleep until the next request
+        if self._started == self._requested:
+            self._running = False
+            self._timer.stop()
+            return
+
+        self._started = self._requested
+        params = self.read() if self.read else self._value
+        if self.threaded:
+            self._future = self._executor.submit(self._compute, self._started, params)
+        else:
+            self._show(self.compute(params))
+
+    def _compute(self, number, params):
+        return number, self.compute(params)
+
+    def _show(self, result):
+        self.draw(result)
+        self.canvas.draw_idle()
+
+    def flush(self):
+        """
+        compute and draw the latest request now, waiting for the worker
+        thread; e.g., before saving the figure from a script.
+        """
+        if self._future is not None:
+            future, self._future = self._future, None
+            concurrent.futures.wait([future])
+        if self._requested:
+            self._started = self._requested
+            params = self.read() if self.read else self._value
+            self._show(self.compute(params))
+
+    def close(self):
+        """
+        stop the timer and the worker thread.
+        """
+        self._timer.stop()
+        self._running = False
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -1,37 +1,42 @@
 # This is a module to demonstrate how a model could be implemented in SedEdu
 # The module is written and executed in Python
+#
+# matplotlib is only imported when the GUI is made, so that importing this
+# module is fast and works without a display.
 
 
 # import libraries
+import argparse
+import contextlib
+import os
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.widgets as widget
-import matplotlib.animation as animation
 
-# convenience function
-def xz_to_fill(x, z):
-    """
-    this simple function provides a convenient way to calculate the polygon
-    vertices for the hillslope from the x and z vectors.
-    """
-    x_fill = np.hstack([x, np.flipud(x)])
-    z_fill = np.hstack([z, -np.ones(z.shape)])
-    return x_fill, z_fill
+# make the hillslope package importable when this file is run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hillslope import model
+from hillslope.checkpoint import Checkpointer, load_checkpoint
+from hillslope.phases import PhaseTimer
+from guitools.coalesce import CoalescedUpdate
+from hillslope.table import LookupTable
+from hillslope.render import FillVertices
 
 
 class GUI(object):
     def __init__(self, hill):
+        import matplotlib.pyplot as plt
+        import matplotlib.widgets as widget
 
         self.hill = hill
 
-        # setup the figure
-        plt.rcParams['toolbar'] = 'None' # turn off the matplotlib toolbar in the figure
-        plt.rcParams['figure.figsize'] = 5, 7 # size of the figure in inches
-
-        self.fig, self.ax = plt.subplots() # gives us a figure object and axes object to manipulate and plot things into
+        # setup the figure, with these settings only for this figure
+        rc = {'toolbar': 'None', # turn off the matplotlib toolbar in the figure
+              'figure.figsize': (5, 7)} # size of the figure in inches
+        with plt.rc_context(rc):
+            self.fig, self.ax = plt.subplots() # gives us a figure object and axes object to manipulate and plot things into
         self.fig.subplots_adjust(left=0.2, bottom=0.4, top=0.95, right=0.9) # where do we want the limits of the axes object
 
-        self.fig.canvas.set_window_title('Hillslope model') # title of the figure window
+        self.fig.canvas.manager.set_window_title('Hillslope model') # title of the figure window
 
         self.ax.set_xlabel("x-distance") # the axis xlabel
         self.ax.set_ylabel("elevation") # the axis ylabel
@@ -40,8 +45,8 @@ class GUI(object):
 
         self.thesky, = self.ax.fill(np.array([-1, -1, hill.x.max(), hill.x.max()]),
                   np.array([-1, 250, 250, -1]), facecolor='aliceblue', edgecolor='none')
-        x_fill, z_fill = xz_to_fill(hill.x, hill.z)
-        self.thehill, = self.ax.fill(x_fill, z_fill, facecolor='forestgreen', edgecolor='k')
+        self.fill = FillVertices(hill.x) # the hillslope polygon, updated in place
+        self.thehill, = self.ax.fill(*self.fill.update(hill.z).T, facecolor='forestgreen', edgecolor='k')
 
         self.thetext = self.ax.text(0.05, 0.05, '$dz/dt_{x=0}$' + '= {:.2f}'.format(hill.dzdt), transform=self.ax.transAxes)
 
@@ -60,7 +65,7 @@ class GUI(object):
 
         self.slide_C_ax = plt.axes([0.2, 0.05, 0.4, 0.05], facecolor=widget_color)
         self.slide_C = widget.Slider(self.slide_C_ax, 'downcut at\n valley', hill.C_min, hill.C_max, 
-                                       valinit=hill.U, valstep=0.05, 
+                                       valinit=hill.C, valstep=0.05, 
                                        valfmt='%g', transform=self.ax.transAxes)
 
         self.btn_hill_reset_ax = plt.axes([0.7, 0.2, 0.25, 0.04])
@@ -76,7 +81,7 @@ class GUI(object):
 
     # reset functions
     def reset_hillslope(self, event):
-        self.hill.z[:] = self.hill.z_init[:]
+        self.hill.reset()
 
     def reset_sliders(self, event):
         self.slide_D.reset()
@@ -85,96 +90,249 @@ class GUI(object):
         self.fig.canvas.draw_idle()
 
 
-class Hill(object):
-    def __init__(self):
+class Hill(model.Hill):
+    """
+    the hillslope model, connected to the sliders and artists of the GUI.
 
-        # parameters
-        self.D = 50 # diffusivity
-        self.U = 0
-        self.dt = 1
-        self.dx = 50
+    The numerics live in `hillslope.model.Hill`; this class only reads the
+    sliders and updates the plot each frame of the animation. Once the
+    hillslope reaches steady state, the animation is stopped until a slider
+    or button wakes it up again.
 
+    Each frame takes `steps_per_frame` model steps, or with `frame_budget`
+    set, as many steps as fit in that many seconds, and then renders once,
+    so that the simulation is not throttled by the drawing speed.
 
-        # set up the x and z arrays for the hillslope
-        self.x = np.arange(start=0, stop=1000, step=self.dx)
-        self.z = np.zeros(self.x.shape)
-        self.z[0:np.int(self.x.size/2)] = 100
-        self.z_init = self.z
-        self.dzdt = 0
+    Each frame returns the artists it changed, so that with blitting only
+    the hillslope polygon and text are redrawn over a cached background.
 
+    If a `checkpointer` is set, it is called every frame to save the model
+    state periodically.
 
-        # limits for the sliders
-        self.D_min = 0
-        self.D_max = 500
-        self.U_max = 1
-        self.U_min = 0
-        self.C_max = 1
-        self.C_min = 0
+    If a `frame_timer` (a `hillslope.phases.PhaseTimer`) is set, the time
+    spent in every phase of the frame is recorded: reading the sliders, the
+    model steps, the polygon and artist updates, the drawing (see
+    `time_drawing`), and the idle time of the event loop. The frame and step
+    rates are shown in the `thefps` text. Setting the model `timer` to the
+    same timer also splits every model step into its own phases, which are
+    then part of the 'model' phase, but slows the stepping down.
 
-        # preallocate vectors for consistency in size
-        self.sedflux_in = np.empty(self.x.shape, dtype=float)
-        self.sedflux_out = np.empty(self.x.shape, dtype=float)
+    If `thepreview` is set, it is a line showing where the profile is
+    heading with the current slider values; it is redrawn with every frame.
+    """
 
+    steps_per_frame = 1
+    frame_budget = None
+    checkpointer = None
+    frame_timer = None
+    thefps = None
+    thepreview = None
+
+    def artists(self):
+        """
+        the artists that change from frame to frame.
+        """
+        artists = [self.thehill, self.thetext]
+        if self.thefps:
+            artists.append(self.thefps)
+        if self.thepreview:
+            artists.append(self.thepreview)
+        return artists
+
+    def connect(self, gui):
+        """
+        take the sliders and artists that each frame reads and updates from
+        `gui`.
+        """
+        self.slide_D = gui.slide_D
+        self.slide_U = gui.slide_U
+        self.slide_C = gui.slide_C
+        self.thehill = gui.thehill
+        self.fill = gui.fill
+        self.thetext = gui.thetext
+        self.thesky = gui.thesky
 
     def __call__(self,i):
 
-        self.D = self.slide_D.val
+        phase = self.frame_timer.phase if self.frame_timer else _no_phase
 
-        # calculate slope and sediment flux
-        rise = self.z[:-1] - self.z[1:]
-        run = self.x[1:] - self.x[:-1]
-        slope = rise / run
-        q = slope * self.D # q is some dimensionless sediment flux, based just on slope and diffusivity    
-        self.sedflux_out[0:-1] = q * self.dt
+        # advance the model with the values from the sliders
+        with phase('sliders'):
+            D, U, C = self.slide_D.val, self.slide_U.val, self.slide_C.val
+        with phase('model'):
+            if self.frame_budget:
+                self.step_for(self.frame_budget, D=D, U=U, C=C)
+            else:
+                self.step(self.steps_per_frame, D=D, U=U, C=C)
 
-        # compute the sed flux into each cell
-        self.sedflux_in[0] = 0
-        self.sedflux_in[1:] = self.sedflux_out[:-1]
+        # update plot
+        with phase('polygon'):
+            vertices = self.fill.update(self.z)
+        with phase('artists'):
+            self.thehill.set_xy(vertices)
+            self.thetext.set_text('$dz/dt_{x=0}$' + '= {:.2f}'.format(self.dzdt))
 
-        # apply some boundary condition to define flux out of downstream cell
-        self.sedflux_out[-1] = self.sedflux_out[-1] # zero-gradient boundary
+        # the rest of the time between two frames is spent waiting for the
+        # timer of the animation
+        if self.frame_timer:
+            self.frame_timer.frame(self.n_steps, rest='idle')
+            if self.thefps:
+                self.thefps.set_text(self.frame_timer.overlay())
 
-        # compute the change in elevation per node
-        dz = (self.sedflux_in - self.sedflux_out) / self.dx
+        # nothing will change until the user does something, so stop
+        if self.is_steady():
+            self.anim.event_source.stop()
 
-        # apply boundary conditions
-        dz[0] = dz[0] + self.slide_U.val
-        dz[-1] = dz[-1] + -self.slide_C.val
-        if self.z[-1] + dz[-1] < 0:
-            dz[-1] = 0
+        if self.checkpointer:
+            self.checkpointer()
 
-        # update elevation
-        self.z = self.z + dz
-        dzdt = dz[0] / self.dt
+        return self.artists()
 
-        # update plot
-        x_fill, z_fill = xz_to_fill(self.x, self.z)
-        self.thehill.set_xy(np.row_stack([x_fill, z_fill]).transpose())
-        self.thetext.set_text('$dz/dt_{x=0}$' + '= {:.2f}'.format(dzdt))
+    def wake(self, event):
+        self.anim.event_source.start()
+
+    def time_drawing(self, anim):
+        """
+        record the drawing that `anim` does around every frame (restoring
+        the background before it, and drawing the artists after it) as the
+        'draw' phase of `frame_timer`. The drawing after a frame is counted
+        in the next frame, as it happens after the frame is closed.
+        """
+        def timed(draw):
+            def timed_draw(framedata, blit):
+                with self.frame_timer.phase('draw'):
+                    draw(framedata, blit)
+            return timed_draw
+
+        anim._pre_draw = timed(anim._pre_draw)
+        anim._post_draw = timed(anim._post_draw)
+
+
+def _no_phase(name):
+    return contextlib.nullcontext()
 
 
 class Runner(object):
-    def __init__(self):
-        
+    """
+    Runner() sets up the model and GUI and starts the animation.
+
+    With `blit=True` (the default) the static parts of the figure (sky, axes,
+    ticks, and sliders) are drawn once and cached, and each frame only redraws
+    the hillslope and text. Use `blit=False` to redraw the whole figure every
+    frame, e.g. for backends that do not support blitting.
+
+    `steps_per_frame` sets how many model steps are taken between frames.
+    Alternatively, `frame_budget` sets how many seconds of each frame are
+    spent stepping the model; faster computers then take more steps per
+    frame and reach steady state sooner.
+
+    `resume` is the path of a checkpoint file to continue a run from. With
+    `checkpoint` set, the model state is saved to that path every
+    `checkpoint_every` steps, and when the figure is closed.
+
+    With `profile=True`, the time spent in every phase of a frame is
+    recorded, the frame and step rates are shown next to the $dz/dt$ text,
+    and a summary of the phases is printed when the figure is closed. With
+    `profile='steps'`, every model step is also split into its phases (flux,
+    boundary conditions, update), at some cost to the stepping speed.
+
+    `mpl_backend` selects the matplotlib backend (e.g., 'TkAgg' or 'QtAgg'),
+    instead of the default one; it must be set before anything else has
+    imported `matplotlib.pyplot`.
+
+    `table` is the path of a lookup table made with `python -m
+    hillslope.table`. The final profile for the slider values is then
+    shown as a dashed line, interpolated from the table as soon as a slider
+    moves. Slider values outside of the table are run live on a worker
+    thread, and the line is updated when they are done.
+    """
+    def __init__(self, blit=True, steps_per_frame=1, frame_budget=None,
+                 resume=None, checkpoint=None, checkpoint_every=10000,
+                 profile=False, table=None, mpl_backend=None):
+        import matplotlib
+        if mpl_backend:
+            matplotlib.use(mpl_backend)
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
 
         # time looping
-        hill = Hill()
+        if resume:
+            hill = load_checkpoint(resume, cls=Hill)
+        else:
+            hill = Hill()
+        hill.steps_per_frame = steps_per_frame
+        hill.frame_budget = frame_budget
         gui = GUI(hill)
 
-        hill.slide_D = gui.slide_D
-        hill.slide_U = gui.slide_U
-        hill.slide_C = gui.slide_C
-        hill.thehill = gui.thehill
-        hill.thetext = gui.thetext
-        hill.thesky = gui.thesky
-
-        anim = animation.FuncAnimation(gui.fig, hill, 
-                                       interval=10, blit=False,
+        hill.connect(gui)
+        if profile:
+            hill.frame_timer = PhaseTimer()
+            if profile == 'steps':
+                hill.timer = hill.frame_timer
+            hill.thefps = gui.ax.text(0.55, 0.05, '', transform=gui.ax.transAxes)
+            gui.fig.canvas.mpl_connect('close_event',
+                                       lambda event: print(hill.frame_timer.summary()))
+
+        if table:
+            lookup = LookupTable.load(table)
+            z_final = np.interp(hill.x, lookup.x, lookup(hill.D, hill.U, hill.C))
+            hill.thepreview, = gui.ax.plot(hill.x, z_final, color='saddlebrown', ls='--', lw=1.5)
+
+            def show_preview(z):
+                hill.thepreview.set_ydata(np.interp(hill.x, lookup.x, z))
+                hill.wake(None)
+
+            preview = CoalescedUpdate(gui.fig.canvas, lambda params: lookup(*params), show_preview,
+                                      read=lambda: (gui.slide_D.val, gui.slide_U.val, gui.slide_C.val),
+                                      threaded=True)
+            for slider in (gui.slide_D, gui.slide_U, gui.slide_C):
+                slider.on_changed(preview)
+
+        anim = animation.FuncAnimation(gui.fig, hill, init_func=hill.artists,
+                                       interval=10, blit=blit,
                                        save_count=None)
+        hill.anim = anim
+        if profile:
+            hill.time_drawing(anim)
+
+        # restart the animation whenever the user changes something
+        for slider in (gui.slide_D, gui.slide_U, gui.slide_C):
+            slider.on_changed(hill.wake)
+        for button in (gui.btn_hill_reset, gui.btn_slide_reset):
+            button.on_clicked(hill.wake)
+
+        # save the state periodically, and when the window is closed
+        if checkpoint:
+            hill.checkpointer = Checkpointer(hill, checkpoint, every=checkpoint_every)
+            gui.fig.canvas.mpl_connect('close_event',
+                                       lambda event: hill.checkpointer.save())
 
         plt.show()
 
 
 
 if __name__ == '__main__':
-    runner = Runner()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='interactive hillslope creep module.')
+    parser.add_argument('--no-blit', action='store_true',
+                        help='redraw the whole figure every frame')
+    parser.add_argument('--steps-per-frame', type=int, default=1,
+                        help='number of model steps between frames')
+    parser.add_argument('--frame-budget', type=float, default=None,
+                        help='seconds of every frame spent stepping the model, '
+                             'instead of a fixed number of steps')
+    parser.add_argument('--resume', help='checkpoint file to continue from')
+    parser.add_argument('--checkpoint', help='checkpoint file to save the run to')
+    parser.add_argument('--checkpoint-every', type=int, default=10000,
+                        help='number of steps between checkpoints')
+    parser.add_argument('--profile', nargs='?', const=True, default=False,
+                        choices=[True, 'steps'],
+                        help="time every phase of a frame, and show the frame rate; "
+                             "'--profile steps' also times the phases of every model step")
+    parser.add_argument('--table', help='lookup table file to preview the final profile from')
+    parser.add_argument('--mpl-backend', help='matplotlib backend to draw with, e.g. TkAgg')
+    args = parser.parse_args()
+
+    runner = Runner(blit=not args.no_blit, steps_per_frame=args.steps_per_frame,
+                    frame_budget=args.frame_budget, resume=args.resume,
+                    checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                    profile=args.profile, table=args.table, mpl_backend=args.mpl_backend)
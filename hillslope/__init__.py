@@ -0,0 +1,7 @@
+# The hillslope package holds the model code used by the hillslope module
+# scripts in this folder. Only numpy is imported here, so that the model
+# can be used without matplotlib (e.g., for batch runs).
+
+from .model import Hill
+from .ensemble import HillEnsemble, ThreadedEnsemble
+from .grid2d import Landscape
@@ -0,0 +1,135 @@
+# These are the compute backends for the explicit hillslope step.
+# A backend is a function that advances the elevation by one step in place:
+#
+#     kernel(z, dz, sedflux_in, sedflux_out, run, D, U, C, dt, width)
+#
+# where `run` is the spacing between the nodes, and `width` the size of the
+# control volume of every node.
+#
+# The numpy backend is always available. The numba backend fuses the slope,
+# flux, divergence, and boundary conditions into a single compiled loop over
+# the nodes, and is only available when numba is installed.
+
+
+import warnings
+
+import numpy as np
+
+
+def numpy_step(z, dz, sedflux_in, sedflux_out, run, D, U, C, dt, width):
+    """
+    take one explicit step with numpy, in the preallocated buffers.
+    """
+    numpy_flux(z, dz, sedflux_in, sedflux_out, run, D, dt, width)
+    apply_boundary(z, dz, U, C, dt)
+
+    # update elevation
+    np.add(z, dz, out=z)
+
+
+def numpy_flux(z, dz, sedflux_in, sedflux_out, run, D, dt, width):
+    """
+    compute the change in elevation of every node from the flux divergence,
+    the first part of `numpy_step`.
+    """
+    q = sedflux_out[0:-1] # view, the flux out of every cell but the last
+
+    # calculate slope and sediment flux
+    np.subtract(z[:-1], z[1:], out=q) # rise
+    np.divide(q, run, out=q) # slope
+    np.multiply(q, D, out=q) # q is some dimensionless sediment flux, based just on slope and diffusivity
+    np.multiply(q, dt, out=q)
+
+    # compute the sed flux into each cell
+    sedflux_in[0] = 0
+    sedflux_in[1:] = q
+
+    # the flux out of the downstream cell, sedflux_out[-1], is never
+    # written and stays zero (closed boundary)
+
+    # compute the change in elevation per node
+    np.subtract(sedflux_in, sedflux_out, out=dz)
+    np.divide(dz, width, out=dz)
+
+
+def apply_boundary(z, dz, U, C, dt):
+    """
+    add the uplift at the crest and the downcut at the valley to `dz`, the
+    second part of `numpy_step`.
+    """
+    dz[0] = dz[0] + U * dt
+    dz[-1] = dz[-1] + -C * dt
+    if z[-1] + dz[-1] < 0:
+        dz[-1] = 0
+
+
+def _fused_step(z, dz, sedflux_in, sedflux_out, run, D, U, C, dt, width):
+    """
+    take one explicit step in a single pass over the nodes.
+
+    The arithmetic is done in the same order as in `numpy_step`, so the
+    results are identical. The flux buffers are not written.
+    """
+    n = z.size
+    q_in = 0.0
+    for i in range(n - 1):
+        # flux out of node i; z[i] is not needed again after this
+        q = (z[i] - z[i+1]) / run[i] * D * dt
+        dz[i] = (q_in - q) / width[i]
+        if i == 0:
+            dz[i] = dz[i] + U * dt
+        z[i] += dz[i]
+        q_in = q
+
+    # the valley node, with a closed downstream boundary
+    dz[n-1] = (q_in - 0.0) / width[n-1]
+    dz[n-1] = dz[n-1] + -C * dt
+    if z[n-1] + dz[n-1] < 0:
+        dz[n-1] = 0
+    z[n-1] += dz[n-1]
+
+
+# registry of the available backends, see `get_backend`
+BACKENDS = {'numpy': numpy_step}
+
+
+def register_backend(name, kernel):
+    """
+    make `kernel` available as the backend `name`.
+    """
+    BACKENDS[name] = kernel
+
+
+def _load_numba():
+    """
+    compile the fused step with numba and register it, if numba is installed.
+    """
+    if 'numba' in BACKENDS:
+        return True
+    try:
+        import numba
+    except ImportError:
+        return False
+    register_backend('numba', numba.njit(cache=True, nogil=True)(_fused_step))
+    return True
+
+
+def get_backend(name='numpy'):
+    """
+    return the kernel for the backend `name`.
+
+    `name` is 'numpy', 'numba', 'auto' (numba when it is installed,
+    otherwise numpy), or any name given to `register_backend`. If 'numba' is
+    requested but numba is not installed, a warning is issued and the numpy
+    backend is returned.
+    """
+    if name in ('numba', 'auto'):
+        if _load_numba():
+            return BACKENDS['numba']
+        if name == 'numba':
+            warnings.warn('numba is not installed, using the numpy backend')
+        return BACKENDS['numpy']
+    if name not in BACKENDS:
+        raise ValueError('backend must be one of {}, not {!r}'.format(
+                         ', '.join(list(BACKENDS) + ['auto']), name))
+    return BACKENDS[name]
@@ -0,0 +1,325 @@
+# This is a benchmark suite for the hillslope model.
+# It times the startup of a fresh Python importing the model and the GUI
+# module, the model step for a range of grid sizes and backends, the
+# update of the hillslope polygon, a whole animation frame of the GUI, and
+# the throughput of the ensemble and sweep tools. The results are written to
+# a JSON file, and two result files can be compared to catch slowdowns.
+#
+# example, from the CSDMS_clinic folder:
+#     python -m hillslope.benchmark --out before.json
+#     (change something)
+#     python -m hillslope.benchmark --out after.json
+#     python -m hillslope.benchmark --compare before.json after.json
+
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from .model import Hill
+from .ensemble import HillEnsemble, ThreadedEnsemble
+from .render import FillVertices
+from . import backends
+
+
+# grid sizes of the step benchmark, 10^2 to 10^7 nodes
+NODES = (10**2, 10**3, 10**4, 10**5, 10**6, 10**7)
+
+# targets for the startup time of a fresh Python importing these modules,
+# in seconds; neither should load matplotlib
+STARTUP_TARGETS = {'hillslope': 0.25,
+                   'hillslope.CSDMS_hillslope_module_funcanimation': 0.25}
+
+
+def _time(func, repeat=5):
+    """
+    time `func` the way `timeit` does: call it enough times for each
+    measurement to take about 0.2 s, `repeat` times over. Returns the best
+    and median seconds per call.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return {'best': times.min(), 'median': np.median(times), 'number': number}
+
+
+def _result(timing, items, unit):
+    """
+    a benchmark result, with the rate in `unit` per second.
+    """
+    return {'seconds': timing['best'],
+            'median': timing['median'],
+            'number': timing['number'],
+            'rate': items / timing['best'],
+            'unit': unit}
+
+
+def _stable_hill(n_nodes, **kwargs):
+    """
+    a hillslope with `n_nodes` nodes, stepped at half the largest stable
+    timestep, so that long benchmarks never blow up.
+    """
+    hill = Hill(dx=1000 / n_nodes, **kwargs)
+    hill.dt = 0.5 * hill.stable_dt()
+    return hill
+
+
+def bench_startup(module, repeat=5):
+    """
+    time a fresh Python interpreter importing `module`, including the
+    startup of the interpreter itself, and compare it to the target in
+    `STARTUP_TARGETS`.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = 'import {}'.format(module)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=root, check=True)
+        times.append(time.perf_counter() - start)
+    result = _result({'best': min(times), 'median': np.median(times), 'number': 1},
+                     1, 'starts')
+    target = STARTUP_TARGETS.get(module)
+    if target:
+        result['target'] = target
+        result['met'] = result['seconds'] <= target
+    return result
+
+
+def bench_step(n_nodes, backend='numpy', repeat=5):
+    """
+    time one explicit step of a `Hill` with `n_nodes` nodes.
+    """
+    hill = _stable_hill(n_nodes, U=0.5, C=1, backend=backend)
+    hill.step() # compile the numba kernel outside of the timing
+    return _result(_time(hill.step, repeat), n_nodes, 'node-steps')
+
+
+def bench_render(n_nodes, repeat=5):
+    """
+    time the update of the hillslope polygon of the GUI: writing the
+    profile into its `FillVertices` and `set_xy`, for a profile of
+    `n_nodes` nodes.
+    """
+    from matplotlib.patches import Polygon
+
+    hill = _stable_hill(n_nodes)
+    fill = FillVertices(hill.x)
+    thehill = Polygon(fill.update(hill.z))
+
+    def render():
+        thehill.set_xy(fill.update(hill.z))
+
+    return _result(_time(render, repeat), 1, 'frames')
+
+
+def bench_frame(blit=True, steps_per_frame=1, repeat=5):
+    """
+    time one frame of the `FuncAnimation` of the GUI on the Agg backend:
+    the model steps, the update of the artists, and the drawing.
+
+    The frames are driven the way `FuncAnimation` drives them from its
+    timer, without an event loop.
+    """
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+    from . import CSDMS_hillslope_module_funcanimation as gui_module
+
+    hill = gui_module.Hill()
+    hill.steps_per_frame = steps_per_frame
+    gui = gui_module.GUI(hill)
+    hill.connect(gui)
+    anim = animation.FuncAnimation(gui.fig, hill, init_func=hill.artists,
+                                   interval=10, blit=blit, cache_frame_data=False)
+    hill.anim = anim
+    gui.fig.canvas.draw()
+    anim._init_draw()
+
+    frames = iter(range(10**9))
+
+    def frame():
+        anim._draw_next_frame(next(frames), anim._blit)
+
+    try:
+        return _result(_time(frame, repeat), 1, 'frames')
+    finally:
+        plt.close(gui.fig)
+
+
+def bench_ensemble(n_members=1000, repeat=5):
+    """
+    time one step of a `HillEnsemble` of `n_members` members.
+    """
+    ensemble = HillEnsemble(D=np.linspace(10, 100, n_members), U=0.5, C=1)
+    return _result(_time(ensemble.step, repeat), n_members, 'member-steps')
+
+
+def bench_threaded(n_members=64, n_nodes=10**4, n_threads=None, backend='numpy',
+                   repeat=5):
+    """
+    time one step of `n_members` models of `n_nodes` nodes, stepped by a
+    `ThreadedEnsemble`.
+    """
+    hills = [_stable_hill(n_nodes, backend=backend) for _ in range(n_members)]
+    with ThreadedEnsemble(hills, n_threads) as ensemble:
+        ensemble.step() # compile the numba kernel outside of the timing
+        result = _result(_time(ensemble.step, repeat), n_members, 'member-steps')
+        result['threads'] = len(ensemble.blocks)
+    return result
+
+
+def bench_sweep(n_runs=64, max_steps=2000, workers=None):
+    """
+    time a sweep of `n_runs` runs of `max_steps` steps each, with a pool of
+    `workers` processes.
+    """
+    from .sweep import sweep
+
+    # steady state is never reached with a tolerance of zero, so every run
+    # takes exactly `max_steps` steps
+    D_values = np.linspace(10, 100, n_runs)
+    start = time.perf_counter()
+    sweep(D_values, [0.5], [1], workers=workers, max_steps=max_steps, tol=0)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'median': seconds, 'number': 1,
+            'rate': n_runs / seconds, 'unit': 'runs',
+            'workers': workers or os.cpu_count() or 1}
+
+
+def run_benchmarks(nodes=NODES, backend_names=('numpy',), gui=True, sweep=True,
+                   repeat=5, log=None):
+    """
+    run the benchmark cases, and return a dictionary with the results of
+    every case and a description of the machine.
+    """
+    cases = [('startup/hillslope', bench_startup, ('hillslope',)),
+             ('startup/gui', bench_startup,
+              ('hillslope.CSDMS_hillslope_module_funcanimation',))]
+    for name in backend_names:
+        for n in nodes:
+            cases.append(('step/{}/{}'.format(name, n), bench_step, (n, name)))
+    if gui:
+        for n in nodes:
+            if n <= 10**6: # beyond this, drawing dominates the polygon update
+                cases.append(('render/{}'.format(n), bench_render, (n,)))
+        cases.append(('frame/blit', bench_frame, (True,)))
+        cases.append(('frame/noblit', bench_frame, (False,)))
+    cases.append(('ensemble/1000', bench_ensemble, (1000,)))
+    for name in backend_names:
+        cases.append(('threaded/{}'.format(name), bench_threaded, (64, 10**4, None, name)))
+    if sweep:
+        cases.append(('sweep/64', bench_sweep, ()))
+
+    results = {}
+    for case, func, args in cases:
+        kwargs = {} if func is bench_sweep else {'repeat': repeat}
+        results[case] = func(*args, **kwargs)
+        if log:
+            line = '{:<24} {:>12.4g} s {:>12.4g} {}/s'.format(
+                case, results[case]['seconds'], results[case]['rate'],
+                results[case]['unit'])
+            if 'target' in results[case]:
+                line += ' (target {:g} s{})'.format(
+                    results[case]['target'], '' if results[case]['met'] else ', missed')
+            log(line)
+
+    machine = {'python': platform.python_version(),
+               'numpy': np.__version__,
+               'platform': platform.platform(),
+               'processor': platform.processor(),
+               'cpu_count': os.cpu_count(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+    return {'machine': machine, 'results': results}
+
+
+def compare(base, new, threshold=0.1):
+    """
+    compare two benchmark result dictionaries, case by case.
+
+    Returns a list of (case, base seconds, new seconds, ratio, flag) for the
+    cases in both, where `flag` is 'slower' if the new time is more than a
+    fraction `threshold` above the base, 'faster' if it is that much below,
+    and '' otherwise.
+    """
+    rows = []
+    for case in base['results']:
+        if case not in new['results']:
+            continue
+        t0 = base['results'][case]['seconds']
+        t1 = new['results'][case]['seconds']
+        ratio = t1 / t0
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'slower'
+        elif ratio < 1 / (1 + threshold):
+            flag = 'faster'
+        rows.append((case, t0, t1, ratio, flag))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m hillslope.benchmark',
+                                     description='benchmark the hillslope model.')
+    parser.add_argument('--out', default='benchmark.json',
+                        help='JSON file to write the results to')
+    parser.add_argument('--max-nodes', type=float, default=NODES[-1],
+                        help='largest grid size of the step benchmark')
+    parser.add_argument('--backend', nargs='+', default=['numpy'],
+                        help="backends to benchmark, e.g. 'numpy numba'")
+    parser.add_argument('--no-gui', action='store_true',
+                        help='skip the cases that need matplotlib')
+    parser.add_argument('--no-sweep', action='store_true',
+                        help='skip the multiprocess sweep case')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measurements of every case')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fractional slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        results = []
+        for path in args.compare:
+            with open(path) as f:
+                results.append(json.load(f))
+        rows = compare(*results, threshold=args.threshold)
+        print('{:<24} {:>12} {:>12} {:>8}'.format('case', 'base (s)', 'new (s)', 'ratio'))
+        for case, t0, t1, ratio, flag in rows:
+            print('{:<24} {:>12.4g} {:>12.4g} {:>8.2f} {}'.format(case, t0, t1, ratio, flag))
+        n_slower = sum(row[4] == 'slower' for row in rows)
+        if n_slower:
+            print('{} case(s) slower by more than {:.0%}'.format(n_slower, args.threshold))
+            return 1
+        return 0
+
+    # the GUI cases draw off screen
+    if not args.no_gui:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    backend_names = []
+    for name in args.backend:
+        if name == 'numba' and not backends._load_numba():
+            print('numba is not installed, skipping the numba backend')
+            continue
+        backend_names.append(name)
+
+    nodes = [n for n in NODES if n <= args.max_nodes]
+    report = run_benchmarks(nodes, backend_names, gui=not args.no_gui,
+                            sweep=not args.no_sweep, repeat=args.repeat, log=print)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    print('wrote {}'.format(args.out))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
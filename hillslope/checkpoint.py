@@ -0,0 +1,105 @@
+# This is the checkpoint/restart support for the hillslope model.
+# The state of a `Hill` is written to a compact binary `.npz` file, so that
+# a long run can be stopped (or pre-empted) and resumed later from where it
+# left off.
+
+
+import os
+
+import numpy as np
+
+from .model import Hill
+
+
+# format version of the checkpoint files
+CHECKPOINT_VERSION = 3
+
+# parameters stored in a checkpoint, and passed back to the model on restart
+PARAMETERS = ('D', 'U', 'C', 'dt', 'dx', 'scheme', 'adaptive', 'cfl',
+              'dz_max', 'dt_max', 'steady_tol', 'backend')
+
+# counters stored in a checkpoint
+COUNTERS = ('n_steps', 'time')
+
+
+def save_checkpoint(hill, path):
+    """
+    write the nodes, control volumes, elevation, last elevation change,
+    parameters, and step counter of `hill` to the `.npz` file `path`.
+
+    The file is written to a temporary name and then moved into place, so
+    that an interrupted write never leaves a broken checkpoint behind.
+    """
+    fields = {name: getattr(hill, name) for name in PARAMETERS + COUNTERS}
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, version=CHECKPOINT_VERSION,
+                 x=hill.x, width=hill._width, z=hill.z, z_init=hill.z_init,
+                 dz=hill.dz, dzdt=hill.dzdt, **fields)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path, cls=Hill):
+    """
+    make a new model of class `cls` from the checkpoint file `path`.
+
+    The model continues from the step counter, simulated time, elevation,
+    and last elevation change stored in the file (so that `is_steady` gives
+    the same answer as before saving), and resets to the stored initial
+    profile.
+    """
+    with np.load(path) as data:
+        version = int(data['version'])
+        if version > CHECKPOINT_VERSION:
+            raise ValueError('checkpoint {} has version {}, newer than the '
+                             'supported version {}'.format(path, version,
+                                                           CHECKPOINT_VERSION))
+        hill = cls(**{name: data[name].item() for name in PARAMETERS})
+        if 'width' in data.files:
+            width = data['width']
+        else:
+            # version 1 files only had evenly spaced grids
+            width = np.full(data['x'].shape, float(data['dx']))
+        hill.set_grid(data['x'], data['z_init'], width)
+        hill.z[:] = data['z']
+        if 'dz' in data.files:
+            hill.dz[:] = data['dz']
+            hill.dzdt = float(data['dzdt'])
+        else:
+            # version 2 and older files did not store the last change, use
+            # the change the next step would make instead
+            hill.dz[:] = hill.tendency() * hill.dt
+            hill.dzdt = hill.dz[0] / hill.dt
+        hill.n_steps = int(data['n_steps'])
+        hill.time = float(data['time'])
+    return hill
+
+
+class Checkpointer(object):
+    """
+    Checkpointer(hill, path, every) saves a checkpoint of `hill` to `path`
+    each time it is called, if at least `every` steps have been taken since
+    the last checkpoint.
+
+    example:
+        checkpointer = Checkpointer(hill, 'hill.npz', every=10000)
+        while not hill.is_steady():
+            hill.step(1000)
+            checkpointer()
+    """
+
+    def __init__(self, hill, path, every=10000):
+        self.hill = hill
+        self.path = path
+        self.every = every
+        self.last_step = hill.n_steps
+
+    def __call__(self):
+        if self.hill.n_steps - self.last_step >= self.every:
+            self.save()
+            return True
+        return False
+
+    def save(self):
+        save_checkpoint(self.hill, self.path)
+        self.last_step = self.hill.n_steps
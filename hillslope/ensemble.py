@@ -0,0 +1,200 @@
+# This is an ensemble version of the hillslope model.
+# Many hillslope profiles are stored as the rows of one 2-D array, and all of
+# them are advanced together with broadcast numpy operations, instead of
+# looping over many instances of `Hill` in Python.
+#
+# For ensembles of separate `Hill` models (e.g., with different schemes or
+# grids), `ThreadedEnsemble` steps blocks of them in a pool of threads.
+
+
+import concurrent.futures
+import itertools
+import os
+import time
+
+import numpy as np
+
+
+class HillEnsemble(object):
+    """
+    HillEnsemble(D, U, C, dx) returns an ensemble of hillslope models.
+
+    `D`, `U`, `C`, `dx`, and `dt` are scalars or vectors with one entry per
+    member. The elevation of all members is stored in `z`, with shape
+    (n_members, n_nodes). Members with a coarser `dx` have fewer nodes over
+    the same `length`; the unused nodes at the end of their rows are masked
+    out by `active` and are never changed.
+
+    Each step uses the same slope, `sedflux_in`, and `sedflux_out` logic as
+    `Hill`, so that every row matches the `Hill` model with the same
+    parameters.
+    """
+
+    def __init__(self, D=50, U=0, C=0, dx=50, dt=1, length=1000):
+
+        # parameters, one per member
+        D, U, C, dx, dt = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=float))
+                                                for p in (D, U, C, dx, dt)])
+        self.D = D.copy() # diffusivity
+        self.U = U.copy() # uplift at crest
+        self.C = C.copy() # downcut at valley
+        self.dx = dx.copy()
+        self.dt = dt.copy()
+        self.n_members = self.D.size
+
+
+        # set up the x and z arrays for the hillslopes
+        self.n_nodes = np.array([np.arange(0, length, d).size for d in self.dx])
+        col = np.arange(self.n_nodes.max())
+        self.x = col[np.newaxis, :] * self.dx[:, np.newaxis]
+        self.active = col[np.newaxis, :] < self.n_nodes[:, np.newaxis]
+        self.z = np.zeros(self.x.shape)
+        self.z[col[np.newaxis, :] < (self.n_nodes // 2)[:, np.newaxis]] = 100
+        self.z_init = self.z.copy()
+        self.dzdt = np.zeros(self.n_members)
+        self.n_steps = 0
+
+        # index of the valley node of every member
+        self._rows = np.arange(self.n_members)
+        self._valley = self.n_nodes - 1
+
+        # links between two active nodes carry flux, all others are closed
+        self._link_active = self.active[:, 1:]
+        self._run = self.x[:, 1:] - self.x[:, :-1]
+
+        # preallocate arrays for consistency in size
+        self.sedflux_in = np.zeros(self.x.shape, dtype=float)
+        self.sedflux_out = np.zeros(self.x.shape, dtype=float)
+
+
+    @classmethod
+    def from_grid(cls, D=(50,), U=(0,), C=(0,), dx=(50,), **kwargs):
+        """
+        make an ensemble with one member for every combination of the given
+        values of `D`, `U`, `C`, and `dx`.
+        """
+        combos = np.array(list(itertools.product(D, U, C, dx)), dtype=float)
+        return cls(D=combos[:, 0], U=combos[:, 1], C=combos[:, 2],
+                   dx=combos[:, 3], **kwargs)
+
+
+    def reset(self):
+        """
+        reset all members to the initial elevation profile.
+        """
+        self.z[:] = self.z_init[:]
+        self.dzdt[:] = 0
+        self.n_steps = 0
+
+
+    def profile(self, i):
+        """
+        return the x and z vectors of member `i`, without the masked nodes.
+        """
+        n = self.n_nodes[i]
+        return self.x[i, :n], self.z[i, :n]
+
+
+    def step(self, n_steps=1):
+        """
+        advance all members by `n_steps` timesteps.
+        """
+        for _ in range(int(n_steps)):
+            self._step_explicit()
+        return self.z
+
+
+    def _step_explicit(self):
+        D = self.D[:, np.newaxis]
+        dt = self.dt[:, np.newaxis]
+        dx = self.dx[:, np.newaxis]
+
+        # calculate slope and sediment flux
+        rise = self.z[:, :-1] - self.z[:, 1:]
+        slope = rise / self._run
+        q = slope * D * self._link_active
+        self.sedflux_out[:, 0:-1] = q * dt
+
+        # compute the sed flux into each cell
+        self.sedflux_in[:, 0] = 0
+        self.sedflux_in[:, 1:] = self.sedflux_out[:, :-1]
+
+        # compute the change in elevation per node
+        dz = (self.sedflux_in - self.sedflux_out) / dx
+
+        # apply boundary conditions
+        dz[:, 0] = dz[:, 0] + self.U * self.dt
+        dz[self._rows, self._valley] += -self.C * self.dt
+        cut_below = self.z[self._rows, self._valley] + dz[self._rows, self._valley] < 0
+        dz[self._rows[cut_below], self._valley[cut_below]] = 0
+
+        # update elevation
+        self.z += dz
+        self.dzdt[:] = dz[:, 0] / self.dt
+        self.n_steps += 1
+
+
+class ThreadedEnsemble(object):
+    """
+    ThreadedEnsemble(hills, n_threads) steps a list of `Hill` models in a
+    pool of `n_threads` threads, each advancing a contiguous block of the
+    models.
+
+    The threads run in parallel while the models compute outside of the
+    Python interpreter lock: numpy releases it inside its array operations
+    (worthwhile for profiles of more than a few thousand nodes), and the
+    numba backend (`Hill(backend='numba')`) releases it for the whole step.
+    Nothing is pickled or copied, so this also works from a notebook.
+
+    After each call to `step`, `steps_per_second` holds the model steps per
+    second achieved by every thread. Close the ensemble (or use it as a
+    context manager) to stop the threads.
+    """
+
+    def __init__(self, hills, n_threads=None):
+        self.hills = list(hills)
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+        n_threads = max(1, min(n_threads, len(self.hills)))
+        bounds = np.linspace(0, len(self.hills), n_threads + 1).astype(int)
+        self.blocks = [self.hills[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self.steps_per_second = [0.0] * n_threads
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def step(self, n_steps=1):
+        """
+        advance every model by `n_steps` timesteps.
+        """
+        futures = [self._executor.submit(_step_block, block, n_steps)
+                   for block in self.blocks]
+        self.steps_per_second = [future.result() for future in futures]
+
+    @property
+    def total_steps_per_second(self):
+        """
+        the model steps per second of all threads together, in the last call
+        to `step`.
+        """
+        return sum(self.steps_per_second)
+
+    def close(self):
+        self._executor.shutdown()
+
+
+def _step_block(block, n_steps):
+    """
+    step every model of `block`, and return the model steps per second.
+    """
+    start = time.perf_counter()
+    for hill in block:
+        hill.step(n_steps)
+    elapsed = time.perf_counter() - start
+    if elapsed == 0:
+        return 0.0
+    return len(block) * n_steps / elapsed
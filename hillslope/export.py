@@ -0,0 +1,237 @@
+# This is the movie and snapshot export of the hillslope model.
+# The model hands raw elevation profiles to a background worker (a thread,
+# or a separate process) through a bounded queue; the worker draws them with
+# matplotlib and writes them to a PNG sequence or a GIF, while the model
+# keeps stepping.
+#
+# example, from the CSDMS_clinic folder:
+#     python -m hillslope.export --out hillslope_demo.gif --steps 20000 --every 100 --U 0.5 --C 1
+
+
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .model import Hill
+from .render import FillVertices
+
+
+FORMATS = ('png', 'gif')
+
+
+def _export_worker(frames, path, x, fmt, options):
+    """
+    draw and write every frame taken from the queue `frames`, until the
+    sentinel `None` is received.
+    """
+    # matplotlib is only needed by the worker, and is used without pyplot,
+    # so that no GUI backend is involved
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=options['figsize'], dpi=options['dpi'])
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    fig.subplots_adjust(left=0.2, bottom=0.15, top=0.95, right=0.9)
+    ax.set_xlabel("x-distance") # the axis xlabel
+    ax.set_ylabel("elevation") # the axis ylabel
+    ax.set_ylim(0, 200) # the axis y limits
+    ax.set_xlim(x.min(), x.max())
+    ax.fill(np.array([-1, -1, x.max(), x.max()]),
+            np.array([-1, 250, 250, -1]), facecolor='aliceblue', edgecolor='none')
+
+    # the x column and bottom edge of the polygon never change
+    fill = FillVertices(x)
+    thehill, = ax.fill(*fill.vertices.T, facecolor='forestgreen', edgecolor='k')
+    thetext = ax.text(0.05, 0.05, '', transform=ax.transAxes)
+
+    gif = _GifStream(path, options['duration']) if fmt == 'gif' else None
+    index = 0
+    try:
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            z, dzdt = frame
+
+            thehill.set_xy(fill.update(z))
+            thetext.set_text('$dz/dt_{x=0}$' + '= {:.2f}'.format(dzdt))
+
+            if fmt == 'png':
+                fig.savefig(os.path.join(path, 'frame_{:05d}.png'.format(index)), dpi=options['dpi'])
+            else:
+                canvas.draw()
+                gif.append(np.asarray(canvas.buffer_rgba()))
+            index += 1
+    finally:
+        if gif:
+            gif.close()
+
+
+class _GifStream(object):
+    """
+    writes a looping GIF to `path` one frame at a time, each with its own
+    palette, so that the frames of a long movie are never all held in
+    memory.
+    """
+
+    def __init__(self, path, duration):
+        self.path = path
+        self.duration = duration
+        self._file = None
+
+    def append(self, rgba):
+        from PIL import Image, GifImagePlugin
+
+        frame = Image.fromarray(rgba).convert('RGB').convert('P', palette=Image.ADAPTIVE)
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'duration': self.duration})
+            for block in header:
+                self._file.write(block)
+        for block in GifImagePlugin.getdata(frame, duration=self.duration,
+                                            include_color_table=True):
+            self._file.write(block)
+
+    def close(self):
+        if self._file is not None:
+            self._file.write(b';') # trailer
+            self._file.close()
+
+
+def _thread_target(exporter, *args):
+    try:
+        _export_worker(*args)
+    except BaseException as err:
+        exporter._error = err
+        # keep draining the queue, so that the producer is never blocked
+        while exporter._frames.get() is not None:
+            pass
+
+
+class FrameExporter(object):
+    """
+    FrameExporter(path, x) returns an exporter which draws hillslope
+    profiles on the nodes `x` in the background, and writes them to `path`.
+
+    With `fmt='png'`, `path` is a folder and every frame is written to it as
+    `frame_00000.png`, `frame_00001.png`, etc. With `fmt='gif'`, `path` is
+    the GIF file, with `duration` milliseconds per frame; every frame is
+    appended to it as it is drawn, and the file is complete once the
+    exporter is closed.
+
+    Calling the exporter with a model copies the elevation profile into a
+    queue of at most `maxsize` frames, which the worker draws from; the
+    model only waits when the worker falls more than `maxsize` frames
+    behind. The worker is a thread, or a separate process with
+    `process=True` (which also takes the drawing off the interpreter of the
+    model). Close the exporter (or use it as a context manager) to finish
+    writing.
+    """
+
+    def __init__(self, path, x, fmt='png', maxsize=16, process=False,
+                 figsize=(5, 4), dpi=100, duration=40):
+        if fmt not in FORMATS:
+            raise ValueError('fmt must be one of {}, not {!r}'.format(
+                             ', '.join(FORMATS), fmt))
+        if fmt == 'png':
+            os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.n_frames = 0
+        self._error = None
+
+        options = {'figsize': figsize, 'dpi': dpi, 'duration': duration}
+        args = (path, np.asarray(x, dtype=float), fmt, options)
+        if process:
+            self._frames = multiprocessing.Queue(maxsize=maxsize)
+            self._worker = multiprocessing.Process(target=_export_worker,
+                                                   args=(self._frames,) + args)
+        else:
+            self._frames = queue.Queue(maxsize=maxsize)
+            self._worker = threading.Thread(target=_thread_target,
+                                            args=(self, self._frames) + args)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __call__(self, hill):
+        self.submit(hill.z, hill.dzdt)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, z, dzdt=0):
+        """
+        queue the elevation profile `z` (copied) to be drawn as a frame.
+        """
+        frame = (np.array(z, dtype=float), float(dzdt))
+        while True:
+            if self._error:
+                raise RuntimeError('the export worker failed') from self._error
+            if not self._worker.is_alive():
+                raise RuntimeError('the export worker has stopped')
+            try:
+                self._frames.put(frame, timeout=1)
+                break
+            except queue.Full:
+                pass
+        self.n_frames += 1
+
+    def close(self):
+        """
+        wait for the worker to draw and write all queued frames.
+        """
+        # only a live worker can take the sentinel off a full queue
+        while self._worker.is_alive():
+            try:
+                self._frames.put(None, timeout=1)
+                break
+            except queue.Full:
+                pass
+        self._worker.join()
+        if isinstance(self._worker, multiprocessing.Process):
+            # frames left for a dead worker must not block the exit
+            self._frames.cancel_join_thread()
+        if self._error:
+            raise RuntimeError('the export worker failed') from self._error
+        if getattr(self._worker, 'exitcode', 0):
+            raise RuntimeError('the export worker exited with code {}'.format(
+                               self._worker.exitcode))
+
+
+def main(argv=None):
+    hill = Hill()
+    parser = argparse.ArgumentParser(prog='python -m hillslope.export',
+                                     description='run the hillslope model and export a movie of it.')
+    parser.add_argument('--out', default='hillslope_demo.gif',
+                        help='GIF file, or folder for a PNG sequence')
+    parser.add_argument('--steps', type=int, default=20000, help='number of model steps')
+    parser.add_argument('--every', type=int, default=100, help='number of steps between frames')
+    parser.add_argument('--D', type=float, default=hill.D, help='diffusivity')
+    parser.add_argument('--U', type=float, default=hill.U, help='uplift at crest')
+    parser.add_argument('--C', type=float, default=hill.C, help='downcut at valley')
+    parser.add_argument('--dx', type=float, default=hill.dx, help='grid spacing')
+    parser.add_argument('--dpi', type=int, default=100, help='resolution of the frames')
+    parser.add_argument('--process', action='store_true',
+                        help='draw the frames in a separate process instead of a thread')
+    args = parser.parse_args(argv)
+
+    fmt = 'gif' if args.out.lower().endswith('.gif') else 'png'
+    hill = Hill(D=args.D, U=args.U, C=args.C, dx=args.dx)
+    with FrameExporter(args.out, hill.x, fmt=fmt, dpi=args.dpi,
+                       process=args.process) as exporter:
+        exporter(hill)
+        while hill.n_steps < args.steps:
+            hill.step(min(args.every, args.steps - hill.n_steps))
+            exporter(hill)
+    print('wrote {} frames to {}'.format(exporter.n_frames, args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# This is a 2-D version of the hillslope model, on a raster grid.
+# The elevation of every cell diffuses to its four neighbours (a 5-point
+# stencil), and the crest-uplift and valley-downcut rules of the 1-D model
+# are applied to any set of cells given as boolean masks.
+#
+# example, from the CSDMS_clinic folder:
+#     python -m hillslope.grid2d
+
+
+import numpy as np
+
+
+class Landscape(object):
+    """
+    Landscape(shape, dx) returns a 2-D hillslope diffusion model on a raster
+    of `shape` = (ny, nx) square cells of size `dx`.
+
+    `uplift_mask` marks the cells raised by `U` per unit time (like the crest
+    of the 1-D model), and `downcut_mask` the cells lowered by `C` per unit
+    time, but never below zero elevation (like the valley). By default these
+    are the first and last columns, so that every row of the raster behaves
+    like the 1-D `Hill` transect. No sediment crosses the edges of the
+    raster.
+
+    All work arrays are allocated once, and each step costs a fixed number
+    of passes over the cells.
+    """
+
+    def __init__(self, shape=(20, 20), dx=50, D=50, U=0, C=0, dt=1, z=None,
+                 uplift_mask=None, downcut_mask=None):
+
+        # parameters
+        self.D = D # diffusivity
+        self.U = U # uplift rate of the uplift cells
+        self.C = C # downcut rate of the downcut cells
+        self.dt = dt
+        self.dx = dx
+        self.shape = tuple(shape)
+        ny, nx = self.shape
+
+        # set up the z array for the landscape, a ridge along the left side
+        if z is None:
+            z = np.zeros(self.shape)
+            z[:, 0:int(nx/2)] = 100
+        self.z = np.array(z, dtype=float)
+        if self.z.shape != self.shape:
+            raise ValueError('z must have shape {}, not {}'.format(self.shape, self.z.shape))
+        self.z_init = self.z.copy()
+        self.n_steps = 0
+        self.time = 0
+
+        # boundary condition masks, stored as flat indices into z
+        if uplift_mask is None:
+            uplift_mask = np.zeros(self.shape, dtype=bool)
+            uplift_mask[:, 0] = True
+        if downcut_mask is None:
+            downcut_mask = np.zeros(self.shape, dtype=bool)
+            downcut_mask[:, -1] = True
+        self.uplift_mask = np.asarray(uplift_mask, dtype=bool)
+        self.downcut_mask = np.asarray(downcut_mask, dtype=bool)
+        self._uplift = np.flatnonzero(self.uplift_mask)
+        self._downcut = np.flatnonzero(self.downcut_mask)
+
+        # preallocate the fluxes across the cell faces and the change in
+        # elevation, so that no arrays are allocated per step
+        self.qx = np.zeros((ny, nx - 1)) # flux from column j to column j+1
+        self.qy = np.zeros((ny - 1, nx)) # flux from row i to row i+1
+        self.dz = np.zeros(self.shape)
+
+
+    def reset(self):
+        """
+        reset the landscape to the initial elevation.
+        """
+        self.z[:] = self.z_init
+        self.dz[:] = 0
+        self.n_steps = 0
+        self.time = 0
+
+
+    def stable_dt(self):
+        """
+        the largest stable timestep of the explicit scheme, dx^2 / (4 D).
+        """
+        if self.D <= 0:
+            return np.inf
+        return 0.25 * self.dx * self.dx / self.D
+
+
+    def step(self, n_steps=1, D=None, U=None, C=None):
+        """
+        advance the model by `n_steps` timesteps. Returns the elevation.
+        """
+        if D is not None:
+            self.D = D
+        if U is not None:
+            self.U = U
+        if C is not None:
+            self.C = C
+        for _ in range(int(n_steps)):
+            self._step_explicit()
+        return self.z
+
+
+    def _step_explicit(self):
+        z, dz, qx, qy = self.z, self.dz, self.qx, self.qy
+        k = self.D * self.dt / self.dx # flux per unit elevation difference
+
+        # sediment flux across the faces, from the slope between neighbours
+        np.subtract(z[:, :-1], z[:, 1:], out=qx)
+        np.multiply(qx, k, out=qx)
+        np.subtract(z[:-1, :], z[1:, :], out=qy)
+        np.multiply(qy, k, out=qy)
+
+        # flux divergence: what comes in minus what goes out of every cell
+        dz.fill(0)
+        dz[:, :-1] -= qx
+        dz[:, 1:] += qx
+        dz[:-1, :] -= qy
+        dz[1:, :] += qy
+        np.divide(dz, self.dx, out=dz)
+
+        # apply boundary conditions
+        flat_z = z.reshape(-1)
+        flat_dz = dz.reshape(-1)
+        flat_dz[self._uplift] += self.U * self.dt
+        flat_dz[self._downcut] += -self.C * self.dt
+        cut = self._downcut[flat_z[self._downcut] + flat_dz[self._downcut] < 0]
+        flat_dz[cut] = 0
+
+        # update elevation
+        np.add(z, dz, out=z)
+        self.n_steps += 1
+        self.time += self.dt
+
+
+class LandscapeView(object):
+    """
+    LandscapeView(landscape) draws the elevation of a `Landscape` with
+    `imshow`, and `update()` refreshes the image in place with `set_data`.
+    """
+
+    def __init__(self, landscape, ax=None, vmin=0, vmax=200, cmap='terrain'):
+        import matplotlib.pyplot as plt
+
+        self.landscape = landscape
+        if ax is None:
+            fig, ax = plt.subplots()
+        self.ax = ax
+        ny, nx = landscape.shape
+        extent = (0, nx * landscape.dx, ny * landscape.dx, 0)
+        self.image = ax.imshow(landscape.z, vmin=vmin, vmax=vmax, cmap=cmap,
+                               extent=extent, interpolation='nearest')
+        ax.set_xlabel("x-distance") # the axis xlabel
+        ax.set_ylabel("y-distance") # the axis ylabel
+        ax.figure.colorbar(self.image, ax=ax, label='elevation')
+
+    def update(self):
+        """
+        refresh the image from the current elevation; returns the changed
+        artists, for blitting.
+        """
+        self.image.set_data(self.landscape.z)
+        return self.image,
+
+
+def main():
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    ny, nx = 200, 200
+    landscape = Landscape(shape=(ny, nx), dx=5, D=5, U=0.05, C=0.1)
+    landscape.z[:] = 0
+    yy, xx = np.mgrid[0:ny, 0:nx]
+    landscape.z[(xx - nx/2)**2 + (yy - ny/2)**2 < (nx/4)**2] = 100 # a round hill
+    landscape.z_init[:] = landscape.z
+
+    view = LandscapeView(landscape)
+
+    def frame(i):
+        landscape.step(10)
+        return view.update()
+
+    anim = animation.FuncAnimation(view.ax.figure, frame, interval=10, blit=True,
+                                   cache_frame_data=False)
+    plt.show()
+
+
+if __name__ == '__main__':
+    main()
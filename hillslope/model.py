@@ -0,0 +1,560 @@
+# This is the numerical core of the hillslope module.
+# It only depends on numpy, so that the model can be stepped without a
+# figure, sliders, or a GUI event loop (e.g., on batch compute nodes).
+
+
+import time
+
+import numpy as np
+
+from .backends import get_backend, numpy_step, numpy_flux, apply_boundary
+
+
+# time integration schemes and their implicitness weights (theta)
+SCHEMES = {'explicit': 0.0, 'crank-nicolson': 0.5, 'implicit': 1.0}
+
+
+def solve_tridiagonal(lower, diag, upper, rhs):
+    """
+    solve the tridiagonal system with sub-diagonal `lower`, diagonal `diag`,
+    and super-diagonal `upper` for the right hand side `rhs`, in O(N).
+
+    `lower` and `upper` have one element less than `diag`. The banded solver
+    from scipy is used when it is installed, otherwise the system is solved
+    with the Thomas algorithm.
+    """
+    try:
+        from scipy.linalg import solve_banded
+    except ImportError:
+        solve_banded = None
+
+    if solve_banded is not None:
+        ab = np.zeros((3, diag.size))
+        ab[0, 1:] = upper
+        ab[1, :] = diag
+        ab[2, :-1] = lower
+        return solve_banded((1, 1), ab, rhs,
+                            overwrite_ab=True, check_finite=False)
+
+    # Thomas algorithm: forward elimination and back substitution
+    n = diag.size
+    c = np.empty(n - 1)
+    d = np.empty(n)
+    c[0] = upper[0] / diag[0]
+    d[0] = rhs[0] / diag[0]
+    for i in range(1, n):
+        denom = diag[i] - lower[i-1] * c[i-1]
+        if i < n - 1:
+            c[i] = upper[i] / denom
+        d[i] = (rhs[i] - lower[i-1] * d[i-1]) / denom
+    for i in range(n - 2, -1, -1):
+        d[i] = d[i] - c[i] * d[i+1]
+    return d
+
+
+class Hill(object):
+    """
+    Hill() returns an instance of the hillslope diffusion model.
+
+    The model state is the elevation vector `z` on the nodes `x`. By default
+    the nodes are evenly spaced `dx` apart over `length`; any increasing
+    node positions can be given as `x` instead. Every node is the centre of
+    a control volume reaching halfway to its neighbours (see `set_grid`), so
+    the sediment balance holds on non-uniform grids too. With `refine` > 0
+    the grid is refined that many times where the initial profile is most
+    curved (see `refine`); the smallest spacing then limits the stable `dt`
+    of the explicit scheme, and a fixed `dt` is reduced to fit it. The
+    state is advanced with the `step` method, which takes the diffusivity,
+    uplift at the crest, and downcut at the valley as arguments, so that any
+    number of steps can be taken in a single call without reading from the
+    GUI.
+
+    `scheme` is one of 'explicit' (the default, as in the tutorial scripts),
+    'implicit' (backward Euler), or 'crank-nicolson'. The implicit schemes
+    are unconditionally stable, so `dt` can be much larger on fine grids.
+
+    With `adaptive=True`, `dt` is chosen before every step from the current
+    diffusivity, grid spacing, and slope field: it is the largest value that
+    keeps the elevation change of every node below `dz_max`, capped at
+    `dt_max`, and for the explicit scheme never more than `cfl` times the
+    stability limit (see `stable_dt`).
+
+    `backend` selects the compute kernel of the explicit step, see
+    `hillslope.backends.get_backend`; 'numba' uses a compiled single-pass
+    loop when numba is installed, and falls back to numpy otherwise.
+
+    Set `timer` to a `hillslope.phases.PhaseTimer` to record the wall time
+    of the flux and boundary condition phases of every explicit step.
+
+    The model is at steady state (see `is_steady`) when no node, including
+    the crest, changes elevation faster than `steady_tol` per unit time.
+    The equilibrium profile can also be computed directly with
+    `steady_state`, without any time stepping.
+    """
+
+    timer = None
+
+    def __init__(self, D=50, U=0, C=0, dt=1, dx=50, length=1000,
+                 scheme='explicit', adaptive=False, cfl=0.9, dz_max=1,
+                 dt_max=1000, steady_tol=1e-6, backend='numpy', x=None,
+                 refine=0):
+
+        # parameters
+        self.D = D # diffusivity
+        self.U = U # uplift at crest
+        self.C = C # downcut at valley
+        self.dt = dt
+        self.dx = dx
+        if scheme not in SCHEMES:
+            raise ValueError('scheme must be one of {}, not {!r}'.format(
+                             ', '.join(SCHEMES), scheme))
+        self.scheme = scheme
+        self.backend = backend
+        self._kernel = get_backend(backend)
+
+        # adaptive timestepping
+        self.adaptive = adaptive
+        self.cfl = cfl
+        self.dz_max = dz_max
+        self.dt_max = dt_max
+
+        # steady state detection
+        self.steady_tol = steady_tol
+
+
+        # set up the x and z arrays for the hillslope
+        if x is None:
+            x = np.arange(start=0, stop=length, step=self.dx)
+            width = np.full(x.shape, float(self.dx))
+        else:
+            x = np.asarray(x, dtype=float)
+            width = None
+            self.dx = np.diff(x).min() # the smallest spacing
+        x_step = x[int(x.size/2)] # the initial knickpoint
+        z = np.zeros(x.shape)
+        z[x < x_step] = 100
+        self.set_grid(x, z, width)
+        self.dzdt = 0
+        self.n_steps = 0
+        self.time = 0 # simulated time
+        self.wall_time = 0 # wall-clock seconds spent stepping
+
+        # refine around the initial knickpoint, keeping it a sharp step
+        for _ in range(refine):
+            self.refine()
+            self.z[:] = np.where(self.x < x_step, 100, 0)
+            self.z_init[:] = self.z
+
+
+        # limits for the sliders
+        self.D_min = 0
+        self.D_max = 500
+        self.U_max = 1
+        self.U_min = 0
+        self.C_max = 1
+        self.C_min = 0
+
+
+    def set_grid(self, x, z, width=None):
+        """
+        set the nodes `x` and the initial elevation `z` of the hillslope,
+        and allocate the work buffers for that grid.
+
+        `width` is the size of the control volume of every node. By default
+        each interior node reaches halfway to its neighbours, and the end
+        nodes reach as far outward as inward, so that on an evenly spaced
+        grid every width is the spacing.
+        """
+        self.x = np.array(x, dtype=float)
+        self.z = np.array(z, dtype=float)
+        self.z_init = self.z.copy()
+        self.dz = np.zeros(self.x.shape)
+
+        # precompute the grid metrics, the x-distance between nodes never changes
+        self._run = self.x[1:] - self.x[:-1]
+        if np.any(self._run <= 0):
+            raise ValueError('the nodes x must be strictly increasing')
+        if width is None:
+            width = np.empty(self.x.shape)
+            width[1:-1] = (self._run[:-1] + self._run[1:]) / 2
+            width[0] = self._run[0]
+            width[-1] = self._run[-1]
+        self._width = np.array(width, dtype=float)
+
+        # preallocate vectors for consistency in size; the explicit step
+        # works in these buffers only, so no arrays are allocated per step
+        # (the numba backend does not fill the sedflux vectors)
+        self.sedflux_in = np.zeros(self.x.shape, dtype=float)
+        self.sedflux_out = np.zeros(self.x.shape, dtype=float)
+
+
+    def reset(self):
+        """
+        reset the hillslope to the initial elevation profile.
+        """
+        self.z[:] = self.z_init[:]
+        self.dzdt = 0
+        self.dz[:] = 0
+        self.n_steps = 0
+        self.time = 0
+        self.wall_time = 0
+
+
+    @property
+    def sim_rate(self):
+        """
+        simulated time per wall-clock second, over all steps taken so far.
+        """
+        if self.wall_time == 0:
+            return 0
+        return self.time / self.wall_time
+
+
+    def step(self, n_steps=1, D=None, U=None, C=None):
+        """
+        advance the model by `n_steps` timesteps.
+
+        `D`, `U`, and `C` default to the values stored on the instance, and
+        when given, are stored on the instance for subsequent calls. Returns
+        the elevation vector after the last step.
+        """
+        self._set_parameters(D, U, C)
+        _step = self._stepper()
+
+        _start = time.perf_counter()
+        for _ in range(int(n_steps)):
+            if self.adaptive:
+                self.dt = self.adapt_dt()
+            _step()
+        self.wall_time += time.perf_counter() - _start
+
+        return self.z
+
+
+    def step_for(self, duration, D=None, U=None, C=None, block=10):
+        """
+        advance the model for about `duration` seconds of wall-clock time.
+
+        The clock is checked after every `block` steps, and at least one
+        block is always taken. Returns the number of steps taken.
+        """
+        self._set_parameters(D, U, C)
+        end = time.perf_counter() + duration
+        n_steps = 0
+        while True:
+            self.step(block)
+            n_steps += block
+            if time.perf_counter() >= end:
+                return n_steps
+
+
+    def run_until(self, t_end, D=None, U=None, C=None):
+        """
+        advance the model until the simulated time reaches `t_end`.
+
+        The last step is shortened to land on `t_end` exactly. Returns the
+        number of steps taken.
+        """
+        self._set_parameters(D, U, C)
+        _step = self._stepper()
+        dt_user = self.dt
+
+        _start = time.perf_counter()
+        n_steps = 0
+        while self.time < t_end:
+            if self.adaptive:
+                self.dt = self.adapt_dt()
+            self.dt = min(self.dt, t_end - self.time)
+            _step()
+            n_steps += 1
+        self.wall_time += time.perf_counter() - _start
+
+        if not self.adaptive:
+            self.dt = dt_user
+        return n_steps
+
+
+    def is_steady(self, tol=None):
+        """
+        whether the last step changed the elevation of every node by less
+        than `tol` (default `steady_tol`) per unit time.
+        """
+        if tol is None:
+            tol = self.steady_tol
+        if self.n_steps == 0:
+            return False
+        return (np.abs(self.dz).max() / self.dt < tol) and (abs(self.dzdt) < tol)
+
+
+    def run_to_steady(self, max_steps=100000, tol=None, check_every=100,
+                      D=None, U=None, C=None, callback=None):
+        """
+        step the model until it reaches steady state, checking every
+        `check_every` steps, or until `max_steps` steps have been taken in
+        total. If given, `callback(self)` is called after every check (e.g.,
+        to record output).
+
+        Returns the simulated time at which steady state was detected, or
+        nan if it was not reached.
+        """
+        self._set_parameters(D, U, C)
+        while self.n_steps < max_steps:
+            self.step(min(check_every, max_steps - self.n_steps))
+            if callback:
+                callback(self)
+            if self.is_steady(tol):
+                return self.time
+        return np.nan
+
+
+    def steady_state(self, D=None, U=None, C=None):
+        """
+        compute the equilibrium elevation profile directly, on the same grid
+        and with the same boundary conditions as the time-stepped model.
+
+        At steady state every link carries the sediment flux uplifted at the
+        crest, `U * dx` (with `dx` the control volume of the crest node), so
+        the profile is linear with slope `U * dx / D`. When the downcut at
+        the valley exceeds the uplift, the valley is cut down to zero
+        elevation and held there. When they balance, the total sediment
+        volume is conserved, so the profile is placed at the mean elevation
+        of the current profile, but never with the valley below zero: the
+        model holds the valley at zero, which adds sediment until the valley
+        settles there. The valley may also be held at zero for a while on the
+        way to a balanced steady state, adding sediment that the current
+        profile does not show, so in that case the result is a lower bound.
+        Parameters default to the values on the instance.
+        """
+        if D is None:
+            D = self.D
+        if U is None:
+            U = self.U
+        if C is None:
+            C = self.C
+        if D <= 0:
+            raise ValueError('no steady state without diffusion (D <= 0)')
+        uplift = U * self._width[0] # sediment volume added per unit time
+        downcut = C * self._width[-1] # sediment volume removed per unit time
+        if downcut < uplift:
+            raise ValueError('no steady state when the uplift at the crest '
+                             'exceeds the downcut at the valley, the hillslope '
+                             'rises without bound')
+
+        # elevation of every node above the valley
+        run = self._run
+        q = uplift # sediment flux through every link
+        drop = np.zeros(self.x.shape)
+        drop[:-1] = np.cumsum((q * run / D)[::-1])[::-1]
+
+        if downcut > uplift:
+            z_valley = 0
+        else:
+            volume = self._width.sum()
+            z_valley = ((self._width * self.z).sum() - (self._width * drop).sum()) / volume
+            z_valley = max(z_valley, 0)
+        return z_valley + drop
+
+
+    def steady_state_error(self):
+        """
+        the largest difference between the current elevation profile and the
+        equilibrium profile from `steady_state`.
+        """
+        return np.abs(self.z - self.steady_state()).max()
+
+
+    def curvature(self):
+        """
+        the second derivative of the elevation profile at every node (zero
+        at the end nodes).
+        """
+        slope = (self.z[1:] - self.z[:-1]) / self._run
+        curvature = np.zeros(self.x.shape)
+        curvature[1:-1] = 2 * (slope[1:] - slope[:-1]) / (self._run[:-1] + self._run[1:])
+        return curvature
+
+
+    def refine(self, levels=1, threshold=0.1):
+        """
+        refine the grid where the elevation profile is most curved.
+
+        Each level splits the spacing on both sides of every node whose
+        curvature is at least `threshold` times the largest curvature, by
+        adding a node halfway between. The elevation and the initial
+        elevation are interpolated onto the new nodes. The counters and
+        parameters of the model are not changed, except that a fixed `dt` of
+        the explicit scheme is reduced to `cfl` times the stable timestep of
+        the refined grid (see `stable_dt`) if it is larger, as the smaller
+        spacing would otherwise make the scheme blow up. Use an implicit
+        scheme to keep a large `dt`.
+        """
+        for _ in range(levels):
+            curvature = np.abs(self.curvature())
+            if curvature.max() == 0:
+                break
+            flagged = curvature >= threshold * curvature.max()
+            split = flagged[:-1] | flagged[1:] # links next to a flagged node
+            midpoints = (self.x[:-1] + self._run / 2)[split]
+            x = np.sort(np.concatenate([self.x, midpoints]))
+
+            z = np.interp(x, self.x, self.z)
+            z_init = np.interp(x, self.x, self.z_init)
+            self.set_grid(x, z)
+            self.z_init[:] = z_init
+        self.dx = self._run.min()
+        if self.scheme == 'explicit' and not self.adaptive:
+            self.dt = min(self.dt, self.cfl * self.stable_dt())
+
+
+    def stable_dt(self, D=None):
+        """
+        the largest stable timestep of the explicit scheme, dx^2 / (2 D) on
+        an evenly spaced grid.
+        """
+        if D is None:
+            D = self.D
+        if D <= 0:
+            return np.inf
+
+        # bound on the largest eigenvalue of the flux-divergence operator
+        coupling = np.zeros(self.x.shape)
+        coupling[:-1] += 1 / self._run
+        coupling[1:] += 1 / self._run
+        coupling /= self._width
+        return 1 / (D * coupling.max())
+
+
+    def tendency(self):
+        """
+        the rate of elevation change dz/dt of every node for the current
+        elevation profile and parameters.
+
+        As in the step, the valley is not cut below zero: a valley at zero
+        that would be lowered does not change.
+        """
+        q = self.D * (self.z[:-1] - self.z[1:]) / self._run
+        dzdt = np.zeros(self.x.shape)
+        dzdt[:-1] -= q
+        dzdt[1:] += q
+        dzdt /= self._width
+        dzdt[0] += self.U
+        dzdt[-1] -= self.C
+        if self.z[-1] <= 0 and dzdt[-1] < 0:
+            dzdt[-1] = 0
+        return dzdt
+
+
+    def adapt_dt(self):
+        """
+        choose the timestep for the next step from the current diffusivity,
+        grid spacing, and slope field.
+        """
+        dt = self.dt_max
+        if self.scheme == 'explicit':
+            dt = min(dt, self.cfl * self.stable_dt())
+        rate = np.abs(self.tendency()).max()
+        if rate > 0:
+            dt = min(dt, self.dz_max / rate)
+        return dt
+
+
+    def _set_parameters(self, D, U, C):
+        if D is not None:
+            self.D = D
+        if U is not None:
+            self.U = U
+        if C is not None:
+            self.C = C
+
+
+    def _stepper(self):
+        if self.scheme == 'explicit':
+            return self._step_explicit
+        return self._step_implicit
+
+
+    def _step_explicit(self):
+        """
+        take one explicit (forward Euler) flux-divergence step with the
+        compute backend, in the preallocated buffers.
+        """
+        if self.timer is None:
+            self._kernel(self.z, self.dz, self.sedflux_in, self.sedflux_out,
+                         self._run, self.D, self.U, self.C, self.dt, self._width)
+        else:
+            self._kernel_timed()
+        self.dzdt = self.dz[0] / self.dt
+        self.n_steps += 1
+        self.time += self.dt
+
+
+    def _kernel_timed(self):
+        """
+        the explicit step of `_step_explicit`, recording every phase with
+        `timer`. Kernels other than numpy fuse the phases, and are recorded
+        as a single 'kernel' phase.
+        """
+        phase = self.timer.phase
+        if self._kernel is not numpy_step:
+            with phase('kernel'):
+                self._kernel(self.z, self.dz, self.sedflux_in, self.sedflux_out,
+                             self._run, self.D, self.U, self.C, self.dt, self._width)
+            return
+        with phase('flux'):
+            numpy_flux(self.z, self.dz, self.sedflux_in, self.sedflux_out,
+                       self._run, self.D, self.dt, self._width)
+        with phase('boundary'):
+            apply_boundary(self.z, self.dz, self.U, self.C, self.dt)
+        with phase('update'):
+            np.add(self.z, self.dz, out=self.z)
+
+
+    def _step_implicit(self):
+        """
+        take one implicit (theta-weighted) step with a tridiagonal solve.
+
+        The flux-divergence operator is the same as in the explicit step,
+        with no flux across the ends, uplift added at the crest, and downcut
+        removed at the valley. If the valley would be cut below zero, the
+        system is solved again with the valley elevation held fixed.
+        """
+        theta = SCHEMES[self.scheme]
+        dt = self.dt
+        g = self.D / self._run # conductance of every link
+
+        # off-diagonals and diagonal of the operator A, with dz/dt = A z + b
+        a_lower = g / self._width[1:]
+        a_upper = g / self._width[:-1]
+        a_diag = np.zeros(self.x.shape)
+        a_diag[:-1] -= g
+        a_diag[1:] -= g
+        a_diag /= self._width
+
+        # right hand side: z + (1 - theta) dt A z + dt b
+        Az = a_diag * self.z
+        Az[:-1] += a_upper * self.z[1:]
+        Az[1:] += a_lower * self.z[:-1]
+        rhs = self.z + (1 - theta) * dt * Az
+        rhs[0] += self.U * dt
+        rhs[-1] += -self.C * dt
+
+        # left hand side: I - theta dt A
+        lower = -theta * dt * a_lower
+        upper = -theta * dt * a_upper
+        diag = 1 - theta * dt * a_diag
+        z_new = solve_tridiagonal(lower, diag, upper, rhs)
+
+        # apply the valley boundary condition
+        if z_new[-1] < 0:
+            lower = lower.copy()
+            lower[-1] = 0
+            diag[-1] = 1
+            rhs[-1] = self.z[-1]
+            z_new = solve_tridiagonal(lower, diag, upper, rhs)
+
+        # update elevation
+        np.subtract(z_new, self.z, out=self.dz)
+        self.z[:] = z_new
+        self.dzdt = self.dz[0] / dt
+        self.n_steps += 1
+        self.time += dt
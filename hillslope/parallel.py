@@ -0,0 +1,218 @@
+# This is a domain-decomposed, multiprocess solver for the hillslope model.
+# The nodes are split into contiguous slabs, one per worker process. The
+# elevation lives in shared memory (two buffers, the old and the new
+# elevation), so that each worker reads the ghost nodes (halo) at the edges
+# of its slab straight from its neighbours' slabs, and no arrays are pickled
+# between processes while stepping. The workers are kept in step with a
+# barrier after every timestep, and the main process starts every call with
+# a semaphore and waits for the workers to finish, checking that they are
+# all still alive.
+
+
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# layout of the shared control array
+_D, _U, _C, _DT, _N_STEPS, _PARITY, _STOP = range(7)
+
+
+def _worker(names, n_nodes, lo, hi, run, width, step_barrier, start, done):
+    """
+    step the nodes `lo` to `hi` (exclusive) each time the main process
+    releases `start`, and release `done` at the end of every call, until
+    told to stop.
+    """
+    shms = [shared_memory.SharedMemory(name=name) for name in names]
+    z = np.ndarray((2, n_nodes), dtype=float, buffer=shms[0].buf)
+    dz = np.ndarray((n_nodes,), dtype=float, buffer=shms[1].buf)[lo:hi]
+    control = np.ndarray((7,), dtype=float, buffer=shms[2].buf)
+
+    # the fluxes on the links into and out of every node of the slab; the
+    # fluxes across the ends of the hillslope are never written and stay zero
+    flux = np.zeros(hi - lo + 1)
+    j0 = 1 if lo == 0 else 0
+    j1 = hi - lo if hi == n_nodes else hi - lo + 1
+    links = slice(lo - 1 + j0, lo - 1 + j1)
+    run = run[links]
+    width = width[lo:hi]
+    rise = flux[j0:j1]
+
+    try:
+        while True:
+            start.acquire() # wait for the main process to start a call
+            if control[_STOP]:
+                break
+            D, U, C, dt = control[_D], control[_U], control[_C], control[_DT]
+            parity = int(control[_PARITY])
+            for _ in range(int(control[_N_STEPS])):
+                z_old = z[parity]
+                z_new = z[1 - parity]
+
+                # calculate slope and sediment flux, reading the halo nodes
+                # lo - 1 and hi from the neighbouring slabs
+                np.subtract(z_old[links], z_old[lo + j0:lo + j1], out=rise)
+                np.divide(rise, run, out=rise)
+                np.multiply(rise, D, out=rise)
+                np.multiply(rise, dt, out=rise)
+
+                # compute the change in elevation per node
+                np.subtract(flux[:-1], flux[1:], out=dz)
+                np.divide(dz, width, out=dz)
+
+                # apply boundary conditions
+                if lo == 0:
+                    dz[0] = dz[0] + U * dt
+                if hi == n_nodes:
+                    dz[-1] = dz[-1] + -C * dt
+                    if z_old[-1] + dz[-1] < 0:
+                        dz[-1] = 0
+
+                # update elevation
+                np.add(z_old[lo:hi], dz, out=z_new[lo:hi])
+                parity = 1 - parity
+                step_barrier.wait() # every slab is done before the next step
+            done.release() # tell the main process the call is done
+    except threading.BrokenBarrierError:
+        pass # another worker stopped, the main process raises the error
+    except BaseException:
+        # release the other workers from the step barrier, so that they stop
+        # too, instead of waiting for this one forever
+        step_barrier.abort()
+        raise
+    finally:
+        del z, dz, control
+        for shm in shms:
+            shm.close()
+
+
+class ParallelHill(object):
+    """
+    ParallelHill(hill, n_workers) steps the explicit scheme of the model
+    `hill` with `n_workers` processes, each updating a contiguous slab of
+    the nodes.
+
+    The results are bit-identical to `hill.step`: every node is updated
+    with the same arithmetic, in the same order, as the numpy backend. The
+    elevation of `hill` is copied into shared memory at the start of every
+    call to `step`, and copied back at the end, so the cost of the copies is
+    spread over all the steps of the call. Close the solver (or use it as a
+    context manager) to stop the workers.
+
+    example:
+        with ParallelHill(Hill(dx=0.01), n_workers=16) as solver:
+            solver.step(10000)
+    """
+
+    def __init__(self, hill, n_workers=None):
+        if hill.scheme != 'explicit' or hill.adaptive:
+            raise ValueError('ParallelHill only supports the explicit scheme with a fixed dt')
+        self.hill = hill
+        n_nodes = hill.x.size
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        n_workers = max(1, min(n_workers, n_nodes // 2))
+        self.n_workers = n_workers
+
+        # shared memory for the old and new elevation, dz, and the controls
+        self._shms = [shared_memory.SharedMemory(create=True, size=2 * n_nodes * 8),
+                      shared_memory.SharedMemory(create=True, size=n_nodes * 8),
+                      shared_memory.SharedMemory(create=True, size=7 * 8)]
+        self._z = np.ndarray((2, n_nodes), dtype=float, buffer=self._shms[0].buf)
+        self._dz = np.ndarray((n_nodes,), dtype=float, buffer=self._shms[1].buf)
+        self._control = np.ndarray((7,), dtype=float, buffer=self._shms[2].buf)
+        self._z[0] = hill.z
+        self._control[:] = 0
+        self._parity = 0
+
+        # start one worker per slab
+        bounds = np.linspace(0, n_nodes, n_workers + 1).astype(int)
+        self._step_barrier = multiprocessing.Barrier(n_workers)
+        self._start = multiprocessing.Semaphore(0)
+        self._done = multiprocessing.Semaphore(0)
+        names = [shm.name for shm in self._shms]
+        self._workers = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            worker = multiprocessing.Process(target=_worker,
+                                             args=(names, n_nodes, lo, hi, hill._run, hill._width,
+                                                   self._step_barrier, self._start, self._done))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def step(self, n_steps=1, D=None, U=None, C=None):
+        """
+        advance the model by `n_steps` timesteps, as `Hill.step`.
+        """
+        hill = self.hill
+        hill._set_parameters(D, U, C)
+        n_steps = int(n_steps)
+        if n_steps < 1:
+            return hill.z
+        if self._closed:
+            raise RuntimeError('ParallelHill is closed')
+
+        # the model may have been changed (e.g., reset) since the last call
+        self._z[self._parity] = hill.z
+
+        self._control[[_D, _U, _C, _DT]] = hill.D, hill.U, hill.C, hill.dt
+        self._control[_N_STEPS] = n_steps
+        self._control[_PARITY] = self._parity
+        for _ in self._workers:
+            self._start.release() # start the workers
+        self._wait()
+        self._parity = (self._parity + n_steps) % 2
+
+        # copy the state back to the model
+        hill.z[:] = self._z[self._parity]
+        hill.dz[:] = self._dz
+        hill.dzdt = hill.dz[0] / hill.dt
+        hill.n_steps += n_steps
+        hill.time += n_steps * hill.dt
+        return hill.z
+
+    def _wait(self, poll=1):
+        """
+        wait for every worker to finish the current call. If a worker has
+        died (killed, or after an error), the solver is closed and an error
+        is raised, instead of waiting forever.
+        """
+        for _ in self._workers:
+            while not self._done.acquire(timeout=poll):
+                if not all(worker.is_alive() for worker in self._workers):
+                    self._step_barrier.abort()
+                    self.close()
+                    raise RuntimeError('a ParallelHill worker stopped unexpectedly')
+
+    def close(self, timeout=10):
+        """
+        stop the workers and release the shared memory. Workers that do not
+        stop within `timeout` seconds are terminated.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._control[_STOP] = 1
+            for _ in self._workers:
+                self._start.release()
+            for worker in self._workers:
+                worker.join(timeout)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+        finally:
+            del self._z, self._dz, self._control
+            for shm in self._shms:
+                shm.close()
+                shm.unlink()
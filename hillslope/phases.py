@@ -0,0 +1,156 @@
+# This is the timing instrumentation of the hillslope model and its GUI.
+# A `PhaseTimer` records the wall time spent in every phase of a frame (the
+# slider reads, the flux computation, the boundary conditions, the polygon
+# construction, the artist updates, and the drawing), and keeps rolling
+# statistics over the last frames, so that it is clear whether the model or
+# the plotting is the bottleneck.
+#
+# example, for a scripted run:
+#     with PhaseTimer() as timer:
+#         hill.timer = timer
+#         for i in range(100):
+#             hill.step(100)
+#             timer.frame(hill.n_steps)
+#     print(timer.summary())
+
+
+import collections
+import contextlib
+import time
+
+
+class PhaseTimer(object):
+    """
+    PhaseTimer(window) records the wall time of the named phases of every
+    frame, and keeps the last `window` frames.
+
+    Wrap each phase in `with timer.phase(name):`; a phase can be entered
+    many times per frame (e.g., once per model step), and its times are
+    summed. Call `frame` at the end of every frame. As a context manager,
+    the timer is reset on entry, and the last frame is closed on exit.
+    """
+
+    def __init__(self, window=100):
+        self.window = window
+        self.reset()
+
+    def __enter__(self):
+        self.reset()
+        self._last_frame = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self._current:
+            self.frame()
+
+    def reset(self):
+        """
+        forget all recorded frames.
+        """
+        self.phases = collections.OrderedDict() # name: seconds of every frame
+        self.frame_times = collections.deque(maxlen=self.window)
+        self.frame_steps = collections.deque(maxlen=self.window)
+        self.n_frames = 0
+        self._current = collections.OrderedDict()
+        self._last_frame = None
+        self._last_steps = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        record the time spent in the `with` block as phase `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        """
+        add `seconds` to phase `name` of the current frame.
+        """
+        self._current[name] = self._current.get(name, 0) + seconds
+
+    def frame(self, n_steps=None, rest=None):
+        """
+        close the current frame.
+
+        `n_steps` is the model step counter at the end of the frame, to
+        compute the steps per second. With `rest` set, the time of the frame
+        not spent in any phase is recorded as phase `rest` (e.g., the drawing
+        done by the event loop between two frames).
+        """
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            interval = now - self._last_frame
+            if rest:
+                self.add(rest, max(0, interval - sum(self._current.values())))
+            self.frame_times.append(interval)
+            if n_steps is not None and self._last_steps is not None:
+                self.frame_steps.append(n_steps - self._last_steps)
+        for name in self._current:
+            if name not in self.phases:
+                self.phases[name] = collections.deque(maxlen=self.window)
+        for name, times in self.phases.items():
+            times.append(self._current.get(name, 0))
+        self._current = collections.OrderedDict()
+        self._last_frame = now
+        self._last_steps = n_steps
+        self.n_frames += 1
+
+    @property
+    def fps(self):
+        """
+        frames per second, over the recorded frames.
+        """
+        total = sum(self.frame_times)
+        if total == 0:
+            return 0.0
+        return len(self.frame_times) / total
+
+    @property
+    def steps_per_second(self):
+        """
+        model steps per second, over the recorded frames.
+        """
+        if not self.frame_steps:
+            return 0.0
+        total = sum(list(self.frame_times)[-len(self.frame_steps):])
+        if total == 0:
+            return 0.0
+        return sum(self.frame_steps) / total
+
+    def stats(self):
+        """
+        the mean, max, and last seconds per frame of every phase, and the
+        fraction of the frame time it takes, over the recorded frames.
+        """
+        frame_time = sum(self.frame_times) / len(self.frame_times) if self.frame_times else 0
+        stats = collections.OrderedDict()
+        for name, times in self.phases.items():
+            mean = sum(times) / len(times)
+            stats[name] = {'mean': mean,
+                           'max': max(times),
+                           'last': times[-1],
+                           'fraction': mean / frame_time if frame_time else 0.0}
+        return stats
+
+    def overlay(self):
+        """
+        a short text with the frame and step rates, for display in a figure.
+        """
+        return '{:.0f} fps, {:.0f} steps/s'.format(self.fps, self.steps_per_second)
+
+    def summary(self):
+        """
+        a table of the phase statistics, slowest phase first.
+        """
+        lines = ['{:<12} {:>10} {:>10} {:>8}'.format('phase', 'mean (ms)', 'max (ms)', 'frame')]
+        stats = self.stats()
+        for name in sorted(stats, key=lambda name: -stats[name]['mean']):
+            s = stats[name]
+            lines.append('{:<12} {:>10.3f} {:>10.3f} {:>8.1%}'.format(
+                         name, 1e3 * s['mean'], 1e3 * s['max'], s['fraction']))
+        lines.append(self.overlay())
+        return '\n'.join(lines)
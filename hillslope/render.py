@@ -0,0 +1,49 @@
+# This is the render adapter between the hillslope model and its plots.
+# The hillslope is drawn as a polygon filled from the elevation profile down
+# to below the axis. Instead of building new vertex arrays every frame (as
+# `xz_to_fill` in the tutorial scripts does), `FillVertices` keeps one array
+# of vertices, and only writes the new elevation into it.
+
+
+import numpy as np
+
+
+class FillVertices(object):
+    """
+    FillVertices(x, bottom) owns the vertices of the polygon that fills the
+    area under a profile on the nodes `x`, down to the elevation `bottom`,
+    ready for `Polygon.set_xy`.
+
+    The vertices are the profile from left to right, the bottom edge from
+    right to left, and the first vertex again, to close the polygon (so
+    that matplotlib uses the array as it is, instead of copying it to close
+    it). The x column and the bottom edge are written once; `update(z)`
+    writes the new elevation into a view of the array, and no arrays are
+    allocated per frame.
+
+    example:
+        fill = FillVertices(hill.x)
+        thehill, = ax.fill(*fill.update(hill.z).T, facecolor='forestgreen')
+        ...
+        thehill.set_xy(fill.update(hill.z))
+    """
+
+    def __init__(self, x, bottom=-1):
+        x = np.asarray(x, dtype=float)
+        n = x.size
+        self.vertices = np.empty((2 * n + 1, 2))
+        self.vertices[:n, 0] = x
+        self.vertices[n:2*n, 0] = x[::-1]
+        self.vertices[n:2*n, 1] = bottom
+        self.vertices[:n, 1] = 0
+        self.vertices[-1] = self.vertices[0]
+        self._top = self.vertices[:n, 1] # view, the elevation of the profile
+        self._close = self.vertices[-1, 1:] # view, the elevation of the closing vertex
+
+    def update(self, z):
+        """
+        write the elevation `z` into the vertices, and return them.
+        """
+        self._top[:] = z
+        self._close[0] = z[0]
+        return self.vertices
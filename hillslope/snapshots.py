@@ -0,0 +1,243 @@
+# This is the time-series output of the hillslope model.
+# Snapshots of the elevation profile are appended to a chunked store on
+# disk: a folder of preallocated, memory-mapped `.npy` files, plus a small
+# `header.json` file, written with only numpy and the standard library.
+#
+# layout of a store folder:
+#     header.json        number of nodes, chunk size, and snapshot count
+#     x.npy              the nodes of the profile
+#     z_00000.npy        (chunk_size, n_nodes) elevation snapshots
+#     step_00000.npy     (chunk_size,) step counter of each snapshot
+#     time_00000.npy     (chunk_size,) simulated time of each snapshot
+#     z_00001.npy        ...
+
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+STORE_VERSION = 1
+
+
+class SnapshotWriter(object):
+    """
+    SnapshotWriter(path, x) returns a writer that appends elevation
+    snapshots on the nodes `x` to the store folder `path`.
+
+    Calling the writer with a model records a snapshot if at least `every`
+    steps were taken since the last one. Snapshots are collected in a buffer
+    of `buffer_size` profiles in memory. Full buffers are handed to a
+    background thread, which copies them into the memory-mapped chunk files
+    and rewrites the header, so that the stepping loop never waits on the
+    disk unless the thread falls `maxsize` buffers behind. The header always
+    counts every snapshot in the chunk files, so a run that is stopped
+    early only loses the snapshots not yet flushed. Close the writer (or
+    use it as a context manager) to write the remaining buffer.
+
+    example:
+        with SnapshotWriter('run_000', hill.x, every=100) as writer:
+            while not hill.is_steady():
+                hill.step(100)
+                writer(hill)
+    """
+
+    def __init__(self, path, x, every=100, chunk_size=1024, buffer_size=64,
+                 maxsize=4, dtype=np.float64):
+        self.path = path
+        self.every = every
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self.n_nodes = np.size(x)
+        self.count = 0 # snapshots written to the chunk files
+        self.last_step = None
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'x.npy'), np.asarray(x))
+        self._chunk_index = None
+        self._write_header()
+
+        # preallocate the buffers; one is filled while the others are
+        # waiting for, or being written by, the writer thread
+        self._free = queue.Queue()
+        for _ in range(maxsize + 1):
+            self._free.put((np.empty((buffer_size, self.n_nodes), dtype=self.dtype),
+                            np.empty(buffer_size, dtype=np.int64),
+                            np.empty(buffer_size, dtype=np.float64)))
+        self._buffer = self._free.get()
+        self._n_buffered = 0
+
+        self._blocks = queue.Queue()
+        self._error = None
+        self._closed = False
+        self._worker = threading.Thread(target=self._write_blocks)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __call__(self, hill):
+        if self.last_step is None or hill.n_steps - self.last_step >= self.every:
+            self.append(hill)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, hill):
+        """
+        record a snapshot of `hill`, regardless of `every`.
+        """
+        z, step, time = self._buffer
+        i = self._n_buffered
+        z[i] = hill.z
+        step[i] = hill.n_steps
+        time[i] = hill.time
+        self._n_buffered += 1
+        self.last_step = hill.n_steps
+        if self._n_buffered == z.shape[0]:
+            self.flush()
+
+    def flush(self):
+        """
+        hand the buffered snapshots to the writer thread, which copies them
+        into the chunk files and then rewrites the header.
+        """
+        self._check()
+        if self._n_buffered == 0:
+            return
+        self._blocks.put((self._buffer, self._n_buffered))
+        self._n_buffered = 0
+        while True:
+            try:
+                self._buffer = self._free.get(timeout=1)
+                break
+            except queue.Empty:
+                self._check()
+
+    def close(self):
+        """
+        write the remaining snapshots and the header, and stop the writer
+        thread.
+        """
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._blocks.put(None)
+            self._worker.join()
+        if self._chunk_index is not None:
+            self._close_chunk()
+        self._write_header()
+        self._check()
+
+    def _check(self):
+        if self._error:
+            raise RuntimeError('the snapshot writer failed') from self._error
+
+    def _write_blocks(self):
+        """
+        the writer thread: write every block taken from the queue, until the
+        sentinel `None` is received.
+        """
+        try:
+            while True:
+                block = self._blocks.get()
+                if block is None:
+                    return
+                self._write(*block)
+                self._free.put(block[0])
+        except BaseException as err:
+            self._error = err
+            # keep returning the buffers, so that the stepping loop is never
+            # blocked, and finds the error
+            while True:
+                block = self._blocks.get()
+                if block is None:
+                    return
+                self._free.put(block[0])
+
+    def _write(self, buffer, n_buffered):
+        buffer_z, buffer_step, buffer_time = buffer
+        start = 0
+        while start < n_buffered:
+            chunk, row = divmod(self.count, self.chunk_size)
+            if chunk != self._chunk_index:
+                self._open_chunk(chunk)
+            n = min(n_buffered - start, self.chunk_size - row)
+            self._z[row:row+n] = buffer_z[start:start+n]
+            self._step[row:row+n] = buffer_step[start:start+n]
+            self._time[row:row+n] = buffer_time[start:start+n]
+            self.count += n
+            start += n
+        self._write_header()
+
+    def _open_chunk(self, chunk):
+        if self._chunk_index is not None:
+            self._close_chunk()
+        self._z = _open_chunk_file(self.path, 'z', chunk, 'w+', self.dtype,
+                                   (self.chunk_size, self.n_nodes))
+        self._step = _open_chunk_file(self.path, 'step', chunk, 'w+', np.int64,
+                                      (self.chunk_size,))
+        self._time = _open_chunk_file(self.path, 'time', chunk, 'w+', np.float64,
+                                      (self.chunk_size,))
+        self._chunk_index = chunk
+
+    def _close_chunk(self):
+        for array in (self._z, self._step, self._time):
+            array.flush()
+        self._z = self._step = self._time = None
+        self._chunk_index = None
+
+    def _write_header(self):
+        """
+        write the header to a temporary file and move it into place, so that
+        a reader never sees a partly written header.
+        """
+        header = {'version': STORE_VERSION, 'n_nodes': self.n_nodes,
+                  'chunk_size': self.chunk_size, 'count': self.count,
+                  'every': self.every, 'dtype': self.dtype.str}
+        filename = os.path.join(self.path, 'header.json')
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(header, f)
+        os.replace(filename + '.tmp', filename)
+
+
+def _open_chunk_file(path, name, chunk, mode, dtype=None, shape=None):
+    filename = os.path.join(path, '{}_{:05d}.npy'.format(name, chunk))
+    return np.lib.format.open_memmap(filename, mode=mode, dtype=dtype, shape=shape)
+
+
+def load_snapshots(path):
+    """
+    read the store folder `path`.
+
+    Returns the nodes `x`, and the step counter, simulated time, and
+    elevation `z` (one row per snapshot) of every snapshot written to the
+    store. When the snapshots fit in one chunk, `z` is a read-only
+    memory-mapped view of the chunk file.
+    """
+    with open(os.path.join(path, 'header.json')) as f:
+        header = json.load(f)
+    count = header['count']
+    chunk_size = header['chunk_size']
+
+    x = np.load(os.path.join(path, 'x.npy'))
+    parts = {'z': [], 'step': [], 'time': []}
+    for chunk in range(-(-count // chunk_size)):
+        n = min(chunk_size, count - chunk * chunk_size)
+        for name in parts:
+            parts[name].append(_open_chunk_file(path, name, chunk, 'r')[:n])
+
+    if not parts['z']:
+        empty = np.empty((0, header['n_nodes']), dtype=header['dtype'])
+        return x, np.empty(0, dtype=np.int64), np.empty(0), empty
+    if len(parts['z']) == 1:
+        return x, parts['step'][0], parts['time'][0], parts['z'][0]
+    return (x, np.concatenate(parts['step']), np.concatenate(parts['time']),
+            np.concatenate(parts['z']))
@@ -0,0 +1,155 @@
+# This is a command line tool to run the hillslope model over a sweep of
+# parameter values, spread across all the cores of a computer.
+#
+# example, from the CSDMS_clinic folder:
+#     python -m hillslope.sweep --D 10 500 50 --U 0 1 11 --C 0 1 11 --out sweep_results
+
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import os
+
+import numpy as np
+
+from .model import Hill
+from .snapshots import SnapshotWriter
+
+
+def run_one(D, U, C, max_steps=100000, tol=1e-6, check_every=100,
+            record=None, **hill_kwargs):
+    """
+    run a single hillslope model until it reaches steady state, or until
+    `max_steps` steps have been taken.
+
+    Steady state is reached when no node changes elevation faster than `tol`
+    per unit time. Returns a dictionary with the parameters, the final
+    profile, the simulated time at which steady state was reached (nan if it
+    was not reached), and `dzdt` at the crest. If `record` is a folder name,
+    the profile is also recorded there every `check_every` steps (see
+    `hillslope.snapshots`).
+    """
+    hill = Hill(D=D, U=U, C=C, **hill_kwargs)
+    if record:
+        with SnapshotWriter(record, hill.x, every=check_every) as writer:
+            writer.append(hill)
+            steady_time = hill.run_to_steady(max_steps, tol, check_every,
+                                             callback=writer)
+    else:
+        steady_time = hill.run_to_steady(max_steps, tol, check_every)
+
+    return {'D': D, 'U': U, 'C': C,
+            'n_steps': hill.n_steps,
+            'steady_time': steady_time,
+            'dzdt': hill.dzdt,
+            'x': hill.x,
+            'z': hill.z}
+
+
+def _run_chunk(chunk, run_kwargs, record_dir=None):
+    """
+    run a chunk of parameter combinations in one worker process.
+    """
+    results = []
+    for i, (D, U, C) in chunk:
+        record = None
+        if record_dir:
+            record = os.path.join(record_dir, 'run_{:05d}'.format(i))
+        results.append(run_one(D, U, C, record=record, **run_kwargs))
+    return results
+
+
+def sweep(D_values, U_values, C_values, workers=None, chunksize=None,
+          record_dir=None, **run_kwargs):
+    """
+    run the model for every combination of the given `D`, `U`, and `C`
+    values, in a pool of `workers` processes.
+
+    The combinations are submitted to the pool in chunks of `chunksize`
+    runs, so that each task is long enough to hide the cost of sending it to
+    a worker. Returns the list of results from `run_one`, in the order of
+    the combinations. With `record_dir` set, the evolution of every run is
+    recorded to `record_dir/run_00000`, `record_dir/run_00001`, etc.
+    """
+    combos = list(enumerate(itertools.product(D_values, U_values, C_values)))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunksize is None:
+        # about four chunks per worker, to balance load between workers
+        chunksize = max(1, len(combos) // (4 * workers))
+
+    chunks = [combos[i:i+chunksize] for i in range(0, len(combos), chunksize)]
+    results = [None] * len(chunks)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_chunk, chunk, run_kwargs, record_dir): i
+                   for i, chunk in enumerate(chunks)}
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+
+    return [r for chunk in results for r in chunk]
+
+
+def write_results(results, out):
+    """
+    write a summary of every run to `out/summary.csv`, and the final
+    profiles to `out/profiles.npz`.
+    """
+    os.makedirs(out, exist_ok=True)
+
+    fields = ['D', 'U', 'C', 'n_steps', 'steady_time', 'dzdt']
+    with open(os.path.join(out, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    profiles = {field: np.array([r[field] for r in results]) for field in fields}
+    profiles['x'] = results[0]['x']
+    profiles['z'] = np.array([r['z'] for r in results])
+    np.savez(os.path.join(out, 'profiles.npz'), **profiles)
+
+
+def main(argv=None):
+    hill = Hill()
+    parser = argparse.ArgumentParser(prog='python -m hillslope.sweep',
+                                     description='run the hillslope model over a sweep of parameters.')
+    parser.add_argument('--D', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.D_min, hill.D_max, 11],
+                        help='diffusivity values, as for numpy.linspace')
+    parser.add_argument('--U', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.U_min, hill.U_max, 11],
+                        help='uplift at crest values, as for numpy.linspace')
+    parser.add_argument('--C', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.C_min, hill.C_max, 11],
+                        help='downcut at valley values, as for numpy.linspace')
+    parser.add_argument('--dx', type=float, default=hill.dx, help='grid spacing')
+    parser.add_argument('--dt', type=float, default=hill.dt, help='timestep')
+    parser.add_argument('--scheme', default=hill.scheme, help='time integration scheme')
+    parser.add_argument('--max-steps', type=int, default=100000,
+                        help='stop a run after this many steps')
+    parser.add_argument('--tol', type=float, default=1e-6,
+                        help='steady state tolerance on dz/dt')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='number of runs sent to a worker at a time')
+    parser.add_argument('--record', action='store_true',
+                        help='record the profile of every run every --check-every steps '
+                             'to OUT/runs')
+    parser.add_argument('--check-every', type=int, default=100,
+                        help='number of steps between steady state checks')
+    parser.add_argument('--out', default='sweep_results', help='output folder')
+    args = parser.parse_args(argv)
+
+    values = [np.linspace(lo, hi, int(num)) for lo, hi, num in (args.D, args.U, args.C)]
+    record_dir = os.path.join(args.out, 'runs') if args.record else None
+    results = sweep(*values, workers=args.workers, chunksize=args.chunksize,
+                    record_dir=record_dir, check_every=args.check_every,
+                    max_steps=args.max_steps, tol=args.tol,
+                    dx=args.dx, dt=args.dt, scheme=args.scheme)
+    write_results(results, args.out)
+    print('wrote {} runs to {}'.format(len(results), args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# This is a precomputed lookup table of the hillslope model.
+# The model is run offline, over a grid of diffusivity, uplift, and downcut
+# values, until it reaches steady state or a maximum number of steps, and
+# the final profiles are stored compactly on disk. A GUI can then show the
+# profile that the sliders lead to by interpolating between the stored
+# profiles, instead of running thousands of steps for every slider event.
+#
+# example, from the CSDMS_clinic folder:
+#     python -m hillslope.table --D 0 500 26 --U 0 1 11 --C 0 1 11 --out hillslope_table.npz
+
+
+import argparse
+import json
+
+import numpy as np
+
+from .model import Hill
+from .sweep import sweep, run_one
+from guitools.cache import ResponseCache
+
+
+# format version of the table files
+TABLE_VERSION = 1
+
+
+class LookupTable(object):
+    """
+    LookupTable(D, U, C, x, z, settings) is a table of the final profiles `z`
+    of the model, with shape (D.size, U.size, C.size, x.size), for every
+    combination of the increasing parameter values `D`, `U`, and `C`.
+
+    `settings` are the keyword arguments of `hillslope.sweep.run_one` used to
+    compute the profiles (grid, timestep, maximum steps, ...), so that
+    profiles outside of the table can be computed live the same way.
+
+    Calling the table with (D, U, C) returns the profile interpolated
+    (trilinearly) between the eight surrounding table entries. Outside of
+    the table, the profile is computed live with `run_one` and remembered
+    (see `guitools.cache.ResponseCache`, with the parameters quantized to
+    `steps`, by default the slider steps of the GUI), which can take a
+    while.
+    """
+
+    def __init__(self, D, U, C, x, z, settings=None, steps=(1, 0.05, 0.05)):
+        self.D = np.asarray(D, dtype=float)
+        self.U = np.asarray(U, dtype=float)
+        self.C = np.asarray(C, dtype=float)
+        self.x = np.asarray(x, dtype=float)
+        self.z = np.asarray(z)
+        self.settings = dict(settings or {})
+        shape = (self.D.size, self.U.size, self.C.size, self.x.size)
+        if self.z.shape != shape:
+            raise ValueError('z must have shape {}, not {}'.format(shape, self.z.shape))
+        self._live = ResponseCache(self.live, steps, max_bytes=256 * self.x.nbytes)
+
+    @classmethod
+    def load(cls, path):
+        """
+        read a table written by `save`.
+        """
+        with np.load(path) as data:
+            version = int(data['version'])
+            if version > TABLE_VERSION:
+                raise ValueError('table {} has version {}, newer than the '
+                                 'supported version {}'.format(path, version, TABLE_VERSION))
+            settings = json.loads(str(data['settings']))
+            return cls(data['D'], data['U'], data['C'], data['x'], data['z'], settings)
+
+    def save(self, path):
+        """
+        write the table to the compressed `.npz` file `path`, with the
+        profiles in single precision.
+        """
+        np.savez_compressed(path, version=TABLE_VERSION,
+                            D=self.D, U=self.U, C=self.C, x=self.x,
+                            z=self.z.astype(np.float32),
+                            settings=json.dumps(self.settings))
+
+    def __call__(self, D, U, C):
+        if self.contains(D, U, C):
+            return self.interpolate(D, U, C)
+        return self._live(D, U, C)
+
+    def contains(self, D, U, C):
+        """
+        whether (D, U, C) is within the range of the table.
+        """
+        for axis, value in ((self.D, D), (self.U, U), (self.C, C)):
+            tol = 1e-9 * max(1, abs(axis[-1] - axis[0])) # round off in the slider values
+            if value < axis[0] - tol or value > axis[-1] + tol:
+                return False
+        return True
+
+    def interpolate(self, D, U, C):
+        """
+        the profile at (D, U, C), interpolated between the surrounding table
+        entries.
+        """
+        corners = [_bracket(self.D, D), _bracket(self.U, U), _bracket(self.C, C)]
+        z = np.zeros(self.x.shape)
+        for i, wi in corners[0]:
+            for j, wj in corners[1]:
+                for k, wk in corners[2]:
+                    w = wi * wj * wk
+                    if w:
+                        z += w * self.z[i, j, k]
+        return z
+
+    def live(self, D, U, C):
+        """
+        compute the profile at (D, U, C) with the settings of the table.
+        """
+        return run_one(D, U, C, **self.settings)['z']
+
+
+def _bracket(axis, value):
+    """
+    the indices of the table values on either side of `value` along `axis`,
+    with their interpolation weights.
+    """
+    if axis.size == 1:
+        return [(0, 1.0)]
+    i = np.searchsorted(axis, value, side='right') - 1
+    i = min(max(i, 0), axis.size - 2)
+    w = (value - axis[i]) / (axis[i+1] - axis[i])
+    w = min(max(w, 0.0), 1.0)
+    return [(i, 1.0 - w), (i + 1, w)]
+
+
+def cached_run(hill, steps=(1, 0.05, 0.05), max_steps=20000, tol=1e-6,
+               check_every=100, **kwargs):
+    """
+    a `ResponseCache` (see `guitools.cache`) of the final profile of
+    `run_one(D, U, C)` on the grid of `hill`, quantized to the steps of the
+    sliders of the GUI, and bounded by their limits.
+
+    Every new slider position runs the model until steady state, which
+    takes a fraction of a second or more; with `prefetch=True` (passed on to
+    `ResponseCache` with the other `kwargs`), the neighbouring slider
+    positions are run in the background.
+
+    example:
+        run = cached_run(hill, prefetch=True)
+        z = run(hill.D, hill.U, hill.C)
+    """
+    settings = dict(dx=hill.dx, dt=hill.dt, scheme=hill.scheme,
+                    max_steps=max_steps, tol=tol, check_every=check_every)
+    bounds = ((hill.D_min, hill.D_max), (hill.U_min, hill.U_max),
+              (hill.C_min, hill.C_max))
+
+    def run(D, U, C):
+        return run_one(D, U, C, **settings)['z']
+
+    return ResponseCache(run, steps, bounds=bounds, **kwargs)
+
+
+def build_table(D_values, U_values, C_values, workers=None, max_steps=20000,
+                tol=1e-6, check_every=100, **hill_kwargs):
+    """
+    run the model for every combination of the given values, with
+    `hillslope.sweep.sweep`, and return the `LookupTable` of the final
+    profiles.
+    """
+    D_values, U_values, C_values = [np.sort(np.asarray(v, dtype=float))
+                                    for v in (D_values, U_values, C_values)]
+    settings = dict(hill_kwargs, max_steps=max_steps, tol=tol, check_every=check_every)
+    results = sweep(D_values, U_values, C_values, workers=workers, **settings)
+    x = results[0]['x']
+    z = np.array([r['z'] for r in results]).reshape(
+        D_values.size, U_values.size, C_values.size, x.size)
+    return LookupTable(D_values, U_values, C_values, x, z, settings)
+
+
+def main(argv=None):
+    hill = Hill()
+    parser = argparse.ArgumentParser(prog='python -m hillslope.table',
+                                     description='precompute a lookup table of the hillslope model.')
+    parser.add_argument('--D', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.D_min, hill.D_max, 26],
+                        help='diffusivity values, as for numpy.linspace')
+    parser.add_argument('--U', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.U_min, hill.U_max, 11],
+                        help='uplift at crest values, as for numpy.linspace')
+    parser.add_argument('--C', nargs=3, type=float, metavar=('MIN', 'MAX', 'NUM'),
+                        default=[hill.C_min, hill.C_max, 11],
+                        help='downcut at valley values, as for numpy.linspace')
+    parser.add_argument('--dx', type=float, default=hill.dx, help='grid spacing')
+    parser.add_argument('--dt', type=float, default=hill.dt, help='timestep')
+    parser.add_argument('--scheme', default=hill.scheme, help='time integration scheme')
+    parser.add_argument('--max-steps', type=int, default=20000,
+                        help='stop a run after this many steps')
+    parser.add_argument('--tol', type=float, default=1e-6,
+                        help='steady state tolerance on dz/dt')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: all cores)')
+    parser.add_argument('--out', default='hillslope_table.npz', help='output file')
+    args = parser.parse_args(argv)
+
+    values = [np.linspace(lo, hi, int(num)) for lo, hi, num in (args.D, args.U, args.C)]
+    table = build_table(*values, workers=args.workers, max_steps=args.max_steps,
+                        tol=args.tol, dx=args.dx, dt=args.dt, scheme=args.scheme)
+    table.save(args.out)
+    print('wrote a table of {} profiles to {}'.format(table.z[..., 0].size, args.out))
+
+
+if __name__ == '__main__':
+    main()